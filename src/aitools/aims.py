@@ -9,7 +9,9 @@ import logging
 import os
 import re
 import time
+import tempfile
 from subprocess import Popen, PIPE
+from multiprocessing.pool import ThreadPool
 
 from aitools.common import shortify
 
@@ -30,6 +32,72 @@ BOOT_MODES_TO_AIMS_OPTS = {'bios': ['--bios'],
 
 BIOSLGCY_PARAMETER_NAME = 'use_legacy_bios_pxeboot'
 
+# Memory-backed filesystem holding the KS while aims2client reads it
+KS_TMPFS_DIR = "/dev/shm"
+
+# Seconds between checks of the sync status of a host
+DEFAULT_SYNC_WAITTIME = 10
+# Upper bound for the wait between checks when backing off
+MAX_SYNC_WAITTIME = 60
+# aims2client processes checking sync statuses at once
+DEFAULT_SYNC_CONCURRENCY = 8
+
+class SyncSchedule(object):
+    """
+    Keeps track of when the sync status of each of the hosts being waited
+    for has to be checked next: right away, then after a wait that doubles
+    after each unsuccessful check (up to max_waittime), the last check
+    happening at the deadline of the host. Shared by the loops waiting for
+    several hosts at once, so they all poll AIMS the same way.
+    """
+    def __init__(self, waittime=DEFAULT_SYNC_WAITTIME, max_waittime=MAX_SYNC_WAITTIME):
+        self.waittime = waittime
+        self.max_waittime = max_waittime
+        # host -> [time of the next check, wait after it, deadline]
+        self.pending = {}
+
+    def __len__(self):
+        return len(self.pending)
+
+    def add(self, host, deadline):
+        """
+        Starts waiting for a host, for deadline seconds at most.
+        """
+        now = time.time()
+        self.pending[host] = [now, self.waittime, now + deadline]
+
+    def due(self):
+        """
+        Returns the hosts that have to be checked now.
+        """
+        now = time.time()
+        return [host for (host, (next_check, _, _)) in self.pending.iteritems()
+            if next_check <= now]
+
+    def checked(self, host, synced):
+        """
+        Records the outcome of a check and returns whether the host is done
+        waiting, either because it's synced or because its deadline has been
+        reached. Hosts done waiting are dropped from the schedule.
+        """
+        _, wait, end = self.pending[host]
+        now = time.time()
+        if synced or now >= end:
+            del self.pending[host]
+            return True
+        self.pending[host] = [min(now + wait, end),
+            min(wait * 2, self.max_waittime), end]
+        return False
+
+    def next_wait(self):
+        """
+        Returns the number of seconds until the next check is due or None
+        if there are no hosts to wait for.
+        """
+        if not self.pending:
+            return None
+        return max(min(x[0] for x in self.pending.itervalues()) - time.time(), 0)
+
 class AimsClient(object):
     def __init__(self, dryrun=False):
         self.dryrun = dryrun
@@ -57,13 +125,14 @@ class AimsClient(object):
         logging.error("* aims2client before attempting to reinstall the host with its new name.")
 
     def addhost(self, fqdn, operatingsystem, architecture, target,
-            enc, ksfilepath, console, mode, user_kopts=None):
+            enc, ks, console, mode, user_kopts=None):
         """
         Registers a host in AIMS for installation.
 
         :param target: String, an AIMS target. Will ignore the OS and Arch info if set.
         :param enc: Hash of host parameters coming from the ENC
-        :param ksfilepath: disk location of the KS file to be uploaded
+        :param ks: content of the KS to be uploaded, handed to aims2client
+            on its standard input instead of through a file on disk
         :param user_kopts: Set of additional kernel options to be passed
         """
         kopts = []
@@ -89,14 +158,18 @@ class AimsClient(object):
         args = ["addhost"] + self._resolv_boot_mode(mode, enc, architecture) +\
             ["--hostname", shortify(fqdn),
             "--name", target,
-            "--kickstart", ksfilepath,
+            "--kickstart", "/dev/stdin",
             "--kopts", "%s" % " ".join(kopts)]
         logging.debug("Argument string to be sent to AIMS: %s" % args)
 
         if self.dryrun:
             logging.info("addhost not called because dryrun is enabled")
 
-        out, returncode = self._exec(args)
+        ksfile = self._ks_file(ks)
+        try:
+            out, returncode = self._exec(args, stdin=ksfile)
+        finally:
+            ksfile.close()
         logging.info(out.strip())
         logging.info("KS for host '%s' uploaded to AIMS." % fqdn)
 
@@ -107,7 +180,96 @@ class AimsClient(object):
         out, returncode = self._exec(args)
         return out
 
-    def wait_for_readiness(self, fqdn, attempts=12, waittime=10):
+    def sync_status(self, fqdn):
+        """
+        Checks whether AIMS has synced the PXE boot of a host on all of
+        its interfaces.
+
+        :param fqdn: the host to check
+        :return: a (synced, details) tuple, details being the output
+            of showhost
+        :raise AiToolsAimsError: in case aims2client fails
+        """
+        hoststatus = self.showhost(fqdn)
+        statuses = []
+        for line in hoststatus.splitlines():
+            match = re.match(r"^PXE boot synced:\s+(?P<status>[yYnN])", line)
+            if match:
+                logging.debug("Found a boot synced statement (%s)" % line)
+                statuses.append(match.group('status'))
+        return (re.match(r"^[yY]+$", "".join(statuses)) is not None, hoststatus)
+
+    def sync_status_many(self, fqdns, concurrency=DEFAULT_SYNC_CONCURRENCY):
+        """
+        Checks the sync status of several hosts, running at most
+        concurrency aims2client processes at once.
+
+        :param fqdns: the hosts to check
+        :param concurrency: maximum number of hosts checked at once
+        :return: a dict fqdn -> (synced, details), details being the
+            output of showhost or why aims2client failed
+        """
+        def check(fqdn):
+            try:
+                return (fqdn, self.sync_status(fqdn))
+            except AiToolsAimsError, error:
+                return (fqdn, (False, str(error)))
+
+        if not fqdns:
+            return {}
+        pool = ThreadPool(processes=min(concurrency, len(fqdns)))
+        try:
+            return dict(pool.map(check, fqdns))
+        finally:
+            pool.close()
+            pool.join()
+
+    def wait_for_readiness_many(self, fqdns, deadline,
+            waittime=DEFAULT_SYNC_WAITTIME, max_waittime=MAX_SYNC_WAITTIME,
+            concurrency=DEFAULT_SYNC_CONCURRENCY):
+        """
+        Waits for the sync state of several hosts to be correct, checking
+        all of them from a single loop following a SyncSchedule, until
+        they're synced or the deadline is reached. Hosts are dropped from
+        the loop as soon as they're synced.
+
+        :param fqdns: the hosts to wait for
+        :param deadline: seconds to wait at most for all the hosts
+        :param waittime: seconds before the second check of a host
+        :param max_waittime: maximum number of seconds between checks
+        :param concurrency: maximum number of hosts checked at once
+        :return: a dict fqdn -> (synced, details), details being the last
+            output of showhost or why aims2client failed
+        """
+        logging.info("Sync waiting loop for %d host(s) started" % len(fqdns))
+        if self.dryrun:
+            logging.info("Nothing to wait for because dryrun is enabled")
+            return dict((fqdn, (True, "")) for fqdn in fqdns)
+
+        schedule = SyncSchedule(waittime, max_waittime)
+        for fqdn in fqdns:
+            schedule.add(fqdn, deadline)
+        results = {}
+        while len(schedule):
+            for (fqdn, (synced, details)) in \
+                    self.sync_status_many(schedule.due(), concurrency).iteritems():
+                results[fqdn] = (synced, details)
+                if not schedule.checked(fqdn, synced):
+                    continue
+                if synced:
+                    logging.info("Sync status for '%s' is set to Y on all "
+                        "interfaces" % fqdn)
+                else:
+                    logging.error("Sync status for '%s' is not Y before the deadline"
+                        % fqdn)
+            wait = schedule.next_wait()
+            if wait is not None:
+                logging.debug("%d host(s) not synced yet, next check in %.1f "
+                    "seconds" % (len(schedule), wait))
+                time.sleep(wait)
+        return results
+
+    def wait_for_readiness(self, fqdn, attempts=12, waittime=DEFAULT_SYNC_WAITTIME):
         """
         Waits a given number of attempts for the sync state to be
         correct with a wait time in between.
@@ -119,15 +281,8 @@ class AimsClient(object):
             return True
 
         for attempt in range(0, attempts):
-            hoststatus = self.showhost(fqdn)
-            statuses = []
-            for line in hoststatus.splitlines():
-                match = re.match(r"^PXE boot synced:\s+(?P<status>[yYnN])", line)
-                if match:
-                    logging.debug("Found a boot synced statement (%s)" % line)
-                    statuses.append(match.group('status'))
-
-            if re.match(r"^[yY]+$", "".join(statuses)):
+            (synced, hoststatus) = self.sync_status(fqdn)
+            if synced:
                 logging.info("Sync status for '%s' is set to Y on all interfaces"
                     % fqdn)
                 return
@@ -184,11 +339,27 @@ class AimsClient(object):
         logging.debug("%s translated into %s" % (operatingsystem, pxetarget))
         return pxetarget
 
-    def _exec(self, args):
+    def _ks_file(self, ks):
+        """
+        Puts the KS in an anonymous file, in memory if possible, that
+        aims2client can open as /dev/stdin. Unlike a pipe, it can be read
+        from the start as many times as needed, and it's gone once closed.
+        """
+        directory = KS_TMPFS_DIR if os.path.isdir(KS_TMPFS_DIR) else None
+        try:
+            ksfile = tempfile.TemporaryFile(prefix='ks.', dir=directory)
+            ksfile.write(ks)
+            ksfile.flush()
+            ksfile.seek(0)
+            return ksfile
+        except (OSError, IOError), error:
+            raise AiToolsAimsError("Couldn't prepare the KS for AIMS (%s)" % error)
+
+    def _exec(self, args, stdin=None):
         """ This is the mega sophisticated interface to AIMS. """
         args = [A2C_BIN_PATH] + args
         logging.debug("Executing %s" % args)
-        aims = Popen(args, stdout=PIPE, stderr=PIPE)
+        aims = Popen(args, stdin=stdin, stdout=PIPE, stderr=PIPE)
         (details, err)  = aims.communicate()
         returncode = aims.returncode
         if returncode != 0:
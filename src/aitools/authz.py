@@ -12,6 +12,7 @@ from aitools.errors import AiToolsAuthzNotImplementedError
 from aitools.httpclient import HTTPClient
 from aitools.config import AuthzConfig
 from aitools.common import deref_url
+from aitools.params import ACCEPT_ENCODING
 
 logger = logging.getLogger(__name__)
 
@@ -56,7 +57,7 @@ class AuthzClient(HTTPClient):
         if self.deref_alias:
             url = deref_url(url)
         headers = {'Accept': 'application/json',
-                   'Accept-Encoding': 'deflate'}
+                   'Accept-Encoding': ACCEPT_ENCODING}
         if data:
             headers["Content-Type"] = "application/json"
 
@@ -64,16 +65,17 @@ class AuthzClient(HTTPClient):
             print url
         try:
             code, response = super(AuthzClient, self).do_request(method, url, headers, data)
-            body = response.text
             if code == requests.codes.unauthorized or code == requests.codes.forbidden:
                 raise AiToolsAuthzNotAllowedError("Unauthorized trying '%s' at '%s'" % (method, url))
             if code == requests.codes.not_implemented:
                 raise AiToolsAuthzNotImplementedError("Server response 501 - Not Implemented")
             if code == requests.codes.internal_server_error:
                 raise AiToolsAuthzInternalServerError("Server response 500 - Internal server error")
-            if code == requests.codes.ok:
-                if re.match('application/json', response.headers['content-type']):
-                    body = response.json()
+            if code == requests.codes.ok and \
+                    re.match('application/json', response.headers['content-type']):
+                body = self.decode_json(response)
+            else:
+                body = response.text
             return (code, body)
         except AiToolsHTTPClientError, error:
             raise AiToolsAuthzError(error)
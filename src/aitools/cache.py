@@ -0,0 +1,116 @@
+import os
+import time
+import errno
+import hashlib
+import logging
+import tempfile
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+from aitools.params import CACHE_DIR
+
+def get_cache_path(namespace, path=None):
+    """
+    Returns the directory where ai-tools keeps cached data of a given kind,
+    honouring XDG_CACHE_HOME.
+
+    :param namespace: name of the subdirectory
+    :param path: override the base directory
+    """
+    base = path or os.environ.get('XDG_CACHE_HOME', None)
+    if base:
+        base = os.path.join(base, 'ai-tools')
+    else:
+        base = os.path.expanduser(CACHE_DIR)
+    return os.path.join(base, namespace)
+
+class DiskCache(object):
+
+    def __init__(self, namespace, ttl, path=None):
+        """
+        Small on-disk key/value store where entries expire after a given
+        amount of seconds. Every entry lives in its own file, written
+        to a temporary file first and then renamed, so several processes
+        can share the cache without locking (also on NFS). Values must be
+        JSON-serializable. Problems accessing the cache are never fatal,
+        they're logged and treated as misses.
+
+        :param namespace: name of the subdirectory holding the entries
+        :param ttl: lifetime of the entries in seconds (0 disables the cache)
+        :param path: override the base directory of the cache
+        """
+        self.ttl = int(ttl or 0)
+        self.path = get_cache_path(namespace, path)
+
+    def enabled(self):
+        return self.ttl > 0
+
+    def get(self, key, default=None):
+        """
+        Returns the value stored for key if it's still fresh.
+
+        :param key: the key to look up
+        :param default: what to return if the key is missing or expired
+        """
+        if not self.enabled():
+            return default
+        filename = self.__filename(key)
+        try:
+            with open(filename) as entry_file:
+                entry = json.load(entry_file)
+        except (IOError, OSError, ValueError):
+            return default
+        if entry.get('key') != key:
+            return default
+        if entry.get('expires', 0) < time.time():
+            logging.debug("Cache entry '%s' expired" % key)
+            self.delete(key)
+            return default
+        return entry['value']
+
+    def set(self, key, value):
+        """
+        Stores value for key, overriding any previous entry.
+
+        :param key: the key to store
+        :param value: the value to store (JSON serializable)
+        """
+        if not self.enabled():
+            return
+        entry = {'key': key, 'expires': time.time() + self.ttl, 'value': value}
+        try:
+            if not os.path.isdir(self.path):
+                os.makedirs(self.path, 0700)
+        except OSError, error:
+            if error.errno != errno.EEXIST:
+                logging.debug("Couldn't create cache directory (%s)" % error)
+                return
+        entry_path = None
+        try:
+            entry_fd, entry_path = tempfile.mkstemp(dir=self.path, prefix='.tmp')
+            with os.fdopen(entry_fd, 'w') as entry_file:
+                json.dump(entry, entry_file)
+            os.rename(entry_path, self.__filename(key))
+        except (IOError, OSError, TypeError, ValueError), error:
+            logging.debug("Couldn't write cache entry '%s' (%s)" % (key, error))
+            if entry_path and os.path.exists(entry_path):
+                os.remove(entry_path)
+
+    def delete(self, key):
+        """
+        Removes key from the cache, if present.
+
+        :param key: the key to remove
+        """
+        try:
+            os.remove(self.__filename(key))
+        except OSError, error:
+            if error.errno != errno.ENOENT:
+                logging.debug("Couldn't delete cache entry '%s' (%s)" % (key, error))
+
+    def __filename(self, key):
+        if isinstance(key, unicode):
+            key = key.encode('utf-8')
+        return os.path.join(self.path, hashlib.sha1(key).hexdigest())
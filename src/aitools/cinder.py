@@ -4,10 +4,12 @@
 import time
 import logging
 import requests
-import cinderclient.exceptions
-from cinderclient.v2 import client
+from aitools.common import LazyModule
 from aitools.errors import AiToolsCinderError
 
+client = LazyModule('cinderclient.v2.client')
+cinder_exceptions = LazyModule('cinderclient.exceptions')
+
 class CinderClient():
 
     DEFAULT_TIMEOUT = 360
@@ -58,9 +60,9 @@ class CinderClient():
                 logging.info("Volume %snot created because dryrun is enabled" % vol_name)
         except requests.exceptions.Timeout, error:
             raise AiToolsCinderError(error)
-        except cinderclient.exceptions.ClientException, error:
+        except cinder_exceptions.ClientException, error:
             raise AiToolsCinderError(error)
-        except cinderclient.exceptions.ConnectionError, error:
+        except cinder_exceptions.ConnectionError, error:
             raise AiToolsCinderError(error)
 
     def get(self, volume_id):
@@ -75,14 +77,14 @@ class CinderClient():
                 "'{1}' and is {2}bootable".format(volume.id, volume.status,
                     ('NOT ' if volume.bootable == 'false' else '')))
             return volume
-        except cinderclient.exceptions.NotFound:
+        except cinder_exceptions.NotFound:
             # Cinder volume doesn't exist
             raise AiToolsCinderError("Volume '%s' doesn't exist" % volume_id)
         except requests.exceptions.Timeout, error:
             raise AiToolsCinderError(error)
-        except cinderclient.exceptions.ClientException, error:
+        except cinder_exceptions.ClientException, error:
             raise AiToolsCinderError(error)
-        except cinderclient.exceptions.ConnectionError, error:
+        except cinder_exceptions.ConnectionError, error:
             raise AiToolsCinderError(error)
 
     def is_ready(self, volume_id, needs_to_be_bootable=False,
@@ -127,9 +129,9 @@ class CinderClient():
                     session=self.auth_client.session)
             except requests.exceptions.Timeout, error:
                 raise AiToolsCinderError(error)
-            except cinderclient.exceptions.ClientException, error:
+            except cinder_exceptions.ClientException, error:
                 raise AiToolsCinderError(error)
-            except cinderclient.exceptions.ConnectionError, error:
+            except cinder_exceptions.ConnectionError, error:
                 raise AiToolsCinderError(error)
         return self.cinder
 
@@ -9,12 +9,15 @@ import hashlib
 import socket
 import time
 import random
-import krbV
+import codecs
+import urllib
+import itertools
+import importlib
+try:
+    import simplejson as json
+except ImportError:
+    import json
 
-from string import Template
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from uuid import UUID
 from urlparse import urlparse
 from collections import namedtuple
 from datetime import datetime
@@ -23,7 +26,14 @@ from aitools.params import FQDN_VALIDATION_RE
 from aitools.params import HASHLEN, MAX_FQDN_LEN
 from aitools.params import DEFAULT_LOGGING_LEVEL
 from aitools.errors import AiToolsInitError
-from aitools.config import CertmgrConfig
+
+JSON_WHITESPACE_RE = re.compile(r'\s*')
+JSON_STRUCTURE_RE = re.compile(r'["\[\]{},]')
+JSON_STRING_SPECIAL_RE = re.compile(r'["\\]')
+# Maximum length of the URL-encoded search parameters built from lists of
+# hosts. Apache rejects request lines and Jetty request headers longer than
+# 8 KiB by default, so keep well below that.
+MAX_QUERY_LENGTH = 4000
 
 DEFAULT_OS_EDITION = 'Base'
 IMAGES_METADATA = {
@@ -32,6 +42,22 @@ IMAGES_METADATA = {
     'cc7' : ('CC',  '7')
 }
 
+class LazyModule(object):
+    """
+    Stands in for a module that is only imported when one of its attributes
+    is accessed for the first time. Used for heavy dependencies so that
+    importing aitools (e.g. to print --help or to tab-complete) stays fast.
+    """
+
+    def __init__(self, name):
+        self.__name = name
+        self.__module = None
+
+    def __getattr__(self, attr):
+        if self.__module is None:
+            self.__module = importlib.import_module(self.__name)
+        return getattr(self.__module, attr)
+
 def configure_logging(args, default_lvl=DEFAULT_LOGGING_LEVEL):
     """Configures application log level based on cmdline arguments"""
     logging_level = default_lvl
@@ -120,6 +146,7 @@ def get_tgt_time(ccache):
     '''
     CredentialTime = namedtuple('CredentialTime',
         'authtime starttime endtime renew_till')
+    import krbV
     tgt_princ_name = 'krbtgt/%(realm)s@%(realm)s' % \
         {'realm': ccache.principal().realm}
     tgt_princ = krbV.Principal(tgt_princ_name, context=ccache.context)
@@ -136,6 +163,7 @@ def verify_kerberos_environment():
     :return: the Kerberos principal name
     :raise AiToolsInitError: if the user has no valid Kerberos token
     """
+    import krbV
     context = krbV.default_context()
     ccache = context.default_ccache()
     try:
@@ -190,6 +218,10 @@ def shortify(h):
     return fqdn.split('.')[0] if fqdn else None
 
 def generate_userdata(args):
+    from string import Template
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+    from aitools.config import CertmgrConfig
     certmgrconf = CertmgrConfig()
     logging.info("Preparing dynamic user data...")
     logging.info("Using '%s' as userdata script template to init Puppet" % \
@@ -231,6 +263,7 @@ def append_domain(hostname):  # todo: replace by fqndify
     return hostname
 
 def is_valid_UUID(value):
+    from uuid import UUID
     try:
         UUID(value, version=4)
         return True
@@ -276,3 +309,165 @@ def get_nova_image_id(nova, image, os_edition=DEFAULT_OS_EDITION):
         image_id = nova.find_image_by_name(image)
 
     return image_id
+
+class _JsonValueScanner(object):
+    """
+    Finds where a JSON value ends without parsing it, resuming from where
+    it stopped when the value is still incomplete, so a value read in many
+    pieces is scanned once and decoded once instead of being decoded again
+    from its start every time a piece comes in.
+    """
+    def __init__(self):
+        self.scanned = 0
+        self.depth = 0
+        self.in_string = False
+        self.end = None
+
+    def find_end(self, buf, start):
+        """
+        Returns the offset in buf where the value starting at start ends
+        or None if it's not complete yet. Offsets are relative to start
+        in between calls, so buf may be trimmed up to start meanwhile.
+        """
+        if self.end is not None:
+            return start + self.end
+        scan = start + self.scanned
+        while True:
+            if self.in_string:
+                match = JSON_STRING_SPECIAL_RE.search(buf, scan)
+                if match is None:
+                    scan = len(buf)
+                    break
+                if match.group() == u'\\':
+                    if match.end() == len(buf):
+                        # Look at the escaped character next time
+                        scan = match.start()
+                        break
+                    scan = match.end() + 1
+                    continue
+                self.in_string = False
+                scan = match.end()
+                if self.depth == 0:
+                    break
+            else:
+                match = JSON_STRUCTURE_RE.search(buf, scan)
+                if match is None:
+                    scan = len(buf)
+                    break
+                char = match.group()
+                scan = match.end()
+                if char == u'"':
+                    self.in_string = True
+                elif char in u'[{':
+                    self.depth += 1
+                elif self.depth == 0:
+                    # Delimiter after a number or a literal
+                    scan = match.start()
+                    break
+                elif char in u']}':
+                    self.depth -= 1
+                    if self.depth == 0:
+                        break
+        self.scanned = scan - start
+        if self.in_string or self.depth or match is None:
+            return None
+        self.end = self.scanned
+        return scan
+
+def iter_json_array(chunks):
+    """
+    Incrementally parses a JSON array read in pieces, yielding its elements
+    as soon as they are complete, so big responses can be processed without
+    holding them in memory. A document which isn't an array is yielded as a
+    single value once it has been read completely.
+
+    :param chunks: iterable of UTF-8 encoded strings, e.g. response.iter_content()
+    :return: a generator of the elements of the array
+    :raise ValueError: if the document is not valid JSON
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    buf, started, scanner = u'', False, None
+    for chunk in itertools.chain(chunks, [None]):
+        eof = chunk is None
+        buf += utf8.decode(chunk or '', final=eof)
+        pos = 0
+        if not started:
+            pos = JSON_WHITESPACE_RE.match(buf).end()
+            if pos == len(buf) and not eof:
+                continue
+            if not buf[pos:pos+1] == u'[':
+                if eof:
+                    yield json.loads(buf)
+                    return
+                continue
+            started = True
+            pos += 1
+        while True:
+            pos = JSON_WHITESPACE_RE.match(buf, pos).end()
+            if pos == len(buf):
+                break
+            if buf[pos] == u']':
+                return
+            if buf[pos] == u',':
+                pos += 1
+                continue
+            if scanner is None:
+                try:
+                    value, end = decoder.raw_decode(buf, pos)
+                except ValueError:
+                    if eof:
+                        raise
+                    # Incomplete: scan the rest as it comes instead of
+                    # decoding it from the start again every time
+                    scanner = _JsonValueScanner()
+            if scanner is not None:
+                if not eof and scanner.find_end(buf, pos) is None:
+                    break
+                value, end = decoder.raw_decode(buf, pos)
+            # Numbers and literals may have been cut short, so only take
+            # values followed by the end of the element
+            after = JSON_WHITESPACE_RE.match(buf, end).end()
+            if after == len(buf) and not eof:
+                break
+            if after < len(buf) and buf[after] not in u',]':
+                if eof:
+                    raise ValueError("Unexpected data at position %d" % after)
+                break
+            yield value
+            scanner = None
+            pos = end
+        buf = buf[pos:]
+    raise ValueError("Unterminated JSON array")
+
+def split_by_query_length(items, encode, separator, base_length=0,
+        max_length=None):
+    """
+    Groups items so that the URL-encoded query built from each group (the
+    items as returned by encode, joined with separator) stays under
+    max_length characters. An item too long on its own gets its own group.
+
+    :param items: the items to group, in order
+    :param encode: function returning the text an item adds to the query
+    :param separator: text the items are joined with
+    :param base_length: length of the URL-encoded rest of the query
+    :param max_length: maximum length (default: MAX_QUERY_LENGTH)
+    :return: a list of lists of items
+    """
+    if max_length is None:
+        max_length = MAX_QUERY_LENGTH
+    separator_length = len(urllib.quote_plus(separator))
+    groups = []
+    group, length = [], base_length
+    for item in items:
+        item_length = len(urllib.quote_plus(encode(item)))
+        if group and length + separator_length + item_length > max_length:
+            groups.append(group)
+            group, length = [], base_length
+        if group:
+            length += separator_length
+        group.append(item)
+        length += item_length
+    if group:
+        groups.append(group)
+    return groups
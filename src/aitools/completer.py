@@ -3,9 +3,15 @@
 
 import glob
 import os
+import time
+import errno
+import logging
+import tempfile
 
 from aitools.foreman import ForemanClient
 from aitools.foreman import AiToolsForemanError
+from aitools.config import ForemanConfig
+from aitools.cache import get_cache_path
 from argcomplete import warn
 import json
 
@@ -17,14 +23,183 @@ import json
 
 FECACHE = '/var/cache/femap/femap.json'
 
+# Completion runs before the configuration file is read, so these are
+# only used if the Foreman settings can't be found there.
+COMPLETION_FOREMAN_HOST = "judy.cern.ch"
+COMPLETION_FOREMAN_PORT = 8443
+COMPLETION_FOREMAN_TIMEOUT = 15
+# Seconds after which a completion index is refreshed in the background.
+COMPLETION_INDEX_TTL = 3600
+# Seconds after which a refresh that didn't finish is considered dead.
+COMPLETION_REFRESH_TIMEOUT = 300
+# Page size used to download the whole table when refreshing an index.
+COMPLETION_REFRESH_PER_PAGE = 1000
+
+class CompletionIndex(object):
+
+    def __init__(self, name, ttl=COMPLETION_INDEX_TTL, path=None):
+        """
+        Sorted list of names stored on disk, one per line, so prefix
+        lookups are a binary search instead of a query to Foreman.
+
+        :param name: name of the index file
+        :param ttl: seconds after which the index is considered stale
+        :param path: override the directory where indexes are stored
+        """
+        self.ttl = ttl
+        self.directory = path or get_cache_path('completion')
+        self.path = os.path.join(self.directory, name)
+
+    def age(self):
+        """
+        Returns the age of the index in seconds or None if it doesn't exist.
+        """
+        try:
+            return max(0, time.time() - os.path.getmtime(self.path))
+        except OSError:
+            return None
+
+    def stale(self):
+        age = self.age()
+        return age is None or age > self.ttl
+
+    def lookup(self, prefix):
+        """
+        Returns the entries starting with prefix. The index is binary
+        searched on disk, so only a few lines around each probe and the
+        matching ones are read, however big it is.
+
+        :param prefix: what the entries have to start with
+        :return: a sorted list or None if there's no index
+        """
+        if isinstance(prefix, unicode):
+            prefix = prefix.encode('utf-8')
+        try:
+            with open(self.path, 'rb') as index_file:
+                index_file.seek(0, os.SEEK_END)
+                low, high = 0, index_file.tell()
+                # First offset whose line is not before the prefix
+                while low < high:
+                    middle = (low + high) // 2
+                    (_, line) = self.__line_from(index_file, middle)
+                    if line and line.rstrip('\n') < prefix:
+                        low = middle + 1
+                    else:
+                        high = middle
+                (start, _) = self.__line_from(index_file, low)
+                index_file.seek(start)
+                matches = []
+                for line in index_file:
+                    if not line.startswith(prefix):
+                        break
+                    matches.append(line.rstrip('\n').decode('utf-8'))
+        except (IOError, OSError, UnicodeError):
+            return None
+        return matches
+
+    def __line_from(self, index_file, offset):
+        """
+        Reads the first whole line starting at or after offset.
+
+        :return: a (start offset, line) tuple, line being empty at the end
+        """
+        if offset == 0:
+            index_file.seek(0)
+        else:
+            index_file.seek(offset - 1)
+            index_file.readline()
+        start = index_file.tell()
+        return (start, index_file.readline())
+
+    def write(self, entries):
+        """
+        Replaces the contents of the index atomically. Entries are sorted
+        by their UTF-8 encoding, the order lookup() searches them in.
+
+        :param entries: iterable of strings
+        """
+        entries = sorted(set([entry.encode('utf-8') if isinstance(entry, unicode)
+            else entry for entry in entries]))
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory, 0700)
+        index_fd, index_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp')
+        try:
+            with os.fdopen(index_fd, 'w') as index_file:
+                for entry in entries:
+                    index_file.write("%s\n" % entry)
+            os.rename(index_path, self.path)
+        except:
+            os.remove(index_path)
+            raise
+
+    def refresh_in_background(self, fetch):
+        """
+        Rebuilds the index with the entries returned by fetch in a
+        detached child process, so the caller doesn't wait for it. Only
+        one refresh per index runs at a time.
+
+        :param fetch: callable returning the entries of the index
+        """
+        lock_path = "%s.lock" % self.path
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory, 0700)
+            if os.path.exists(lock_path) and \
+                    time.time() - os.path.getmtime(lock_path) > COMPLETION_REFRESH_TIMEOUT:
+                os.remove(lock_path)
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0600))
+        except OSError, error:
+            if error.errno != errno.EEXIST:
+                logging.debug("Couldn't lock '%s' (%s)" % (lock_path, error))
+            return
+
+        if os.fork() > 0:
+            return
+        # Child: detach from the shell waiting for the completions,
+        # which would otherwise block until our copies of its pipes
+        # are closed.
+        try:
+            os.setsid()
+            devnull = os.open(os.devnull, os.O_RDWR)
+            for fd in (0, 1, 2):
+                os.dup2(devnull, fd)
+            os.closerange(3, 256)
+            self.write(fetch())
+        except:
+            pass
+        finally:
+            try:
+                os.remove(lock_path)
+            except OSError:
+                pass
+            os._exit(0)
+
 class ForemanCompleter(object):
     """Completes item from within forman"""
-    def __init__(self,model='hosts',item='name'):
+    def __init__(self,model='hosts',item='name',ttl=COMPLETION_INDEX_TTL):
         self.model = model
         self.item = item
+        self.ttl = ttl
 
     def __call__(self, prefix, parsed_args, **kwargs):
-        foreman = ForemanClient(host="judy.cern.ch", port=8443, timeout=15, dryrun=True)
+        fmconfig = ForemanConfig()
+        foreman = ForemanClient(
+            host=getattr(fmconfig, 'foreman_hostname', COMPLETION_FOREMAN_HOST),
+            port=getattr(fmconfig, 'foreman_port', COMPLETION_FOREMAN_PORT),
+            timeout=getattr(fmconfig, 'foreman_timeout', COMPLETION_FOREMAN_TIMEOUT),
+            dryrun=True)
+
+        index = CompletionIndex("%s-%s-%s" % (foreman.host, self.model, self.item),
+            ttl=self.ttl)
+        if index.stale():
+            index.refresh_in_background(lambda: [item[self.item] for item in
+                foreman.search_query(self.model, '',
+                    per_page=COMPLETION_REFRESH_PER_PAGE)])
+        matches = index.lookup(prefix)
+        if matches is not None:
+            return matches
+
+        # No index yet, ask Foreman while it's being built
         if prefix == '':
            query = ''
         else:
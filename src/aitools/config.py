@@ -102,6 +102,8 @@ class ForemanConfig(AiConfig):
         parser.add_argument('--foreman-timeout', type=int, help="Timeout for Foreman operations")
         parser.add_argument('--foreman-hostname', help="Foreman hostname")
         parser.add_argument('--foreman-port', type=int, help="Foreman port")
+        parser.add_argument('--foreman-max-parallel-pages', type=int,
+            help="Maximum number of result pages fetched concurrently by expensive searches")
         self.add_global_args(parser)
 
 
@@ -1,6 +1,7 @@
 __author__ = 'mccance'
 
-import yaml
+import copy
+import time
 import requests
 import logging
 
@@ -10,10 +11,22 @@ from aitools.httpclient import HTTPClient
 from aitools.config import EncConfig
 from distutils.util import strtobool
 from aitools.common import deref_url
+from aitools.common import LazyModule
+from aitools.cache import DiskCache
+
+yaml = LazyModule('yaml')
+
+def yaml_loader():
+    """
+    Returns the fastest safe YAML loader available, the one backed by
+    libyaml if PyYAML was built with it.
+    """
+    return getattr(yaml, 'CSafeLoader', None) or yaml.SafeLoader
 
 class EncClient(HTTPClient):
 
-    def __init__(self, host=None, port=None, timeout=None, dryrun=False, deref_alias=False):
+    def __init__(self, host=None, port=None, timeout=None, dryrun=False, deref_alias=False,
+            cache_ttl=None):
         """
         ENC client for interacting with the ENC service. Autoconfigures via the AiConfig
         object.
@@ -23,6 +36,9 @@ class EncClient(HTTPClient):
         :param timeout: override the auto-configured ENC timeout
         :param dryrun: create a dummy client
         :param deref_alias: resolve dns load balanced aliases
+        :param cache_ttl: override the auto-configured lifetime (in seconds) of
+          the in-process and on-disk caches of node classifications (0 disables
+          them)
         """
         encconf = EncConfig()
         self.host = host or encconf.enc_hostname
@@ -31,14 +47,37 @@ class EncClient(HTTPClient):
         self.dryrun = dryrun
         self.deref_alias = deref_alias
         self.cache = {}
+        if cache_ttl is None:
+            cache_ttl = getattr(encconf, 'enc_cache_ttl', 0)
+        self.disk_cache = DiskCache('enc', cache_ttl)
 
     def get_node_enc(self, hostname):
         """
-        Return the specified node's ENC data.
+        Return the specified node's ENC data. If the cache is enabled,
+        successful answers are reused for cache_ttl seconds, by this client
+        and (through the disk) by other processes.
 
         :param hostname: the node to query
         :return: the parsed YAML of the node's ENC
         """
+        if not self.disk_cache.enabled():
+            return self.__get_node_enc(hostname)
+        cache_key = "%s|%s" % (self.host, hostname)
+        (expires, yam) = self.cache.get(cache_key, (0, None))
+        if expires < time.time():
+            yam = self.disk_cache.get(cache_key)
+            if yam is not None:
+                logging.debug("ENC data of '%s' found in disk cache" % hostname)
+            else:
+                (code, yam) = self.__get_node_enc(hostname)
+                if code != requests.codes.ok:
+                    return (code, yam)
+                self.disk_cache.set(cache_key, yam)
+            self.cache[cache_key] = (time.time() + self.disk_cache.ttl, yam)
+        # Callers are free to modify what they get
+        return (requests.codes.ok, copy.deepcopy(yam))
+
+    def __get_node_enc(self, hostname):
         logging.info("Getting host '%s' from the ENC..." % hostname)
         return self.__do_api_request("get", "node/%s?format=yml" % (hostname,))
 
@@ -57,8 +96,9 @@ class EncClient(HTTPClient):
                 raise AiToolsEncError("The ENC payload couldn't be computed")
             elif code == requests.codes.unauthorized or code == requests.codes.forbidden:
                 raise AiToolsEncError("Unauthorized when contacting ENC")
-            body = response.text
-            yam = yaml.load(body)
+            # libyaml decodes the bytes itself, much faster than
+            # requests guessing the encoding of response.text
+            yam = yaml.load(response.content, Loader=yaml_loader())
             return (code, yam)
         except AiToolsHTTPClientError, error:
             raise AiToolsEncError(error)
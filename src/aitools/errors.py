@@ -110,6 +110,9 @@ class AiToolsTrustedBagInternalServerError(AiToolsTrustedBagError):
 class AiToolsAiForemanError(AiToolsError):
     pass
 
+class AiToolsInventoryError(AiToolsError):
+    pass
+
 class AiToolsPwnError(AiToolsError):
     pass
 
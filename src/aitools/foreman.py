@@ -8,6 +8,7 @@ import urllib
 import re
 import requests
 import math
+from multiprocessing.pool import ThreadPool
 
 from aitools.errors import AiToolsHTTPClientError
 from aitools.errors import AiToolsForemanError
@@ -17,14 +18,33 @@ from aitools.common import print_progress_meter, shortify
 from aitools.httpclient import HTTPClient
 from aitools.config import ForemanConfig
 from aitools.common import deref_url
+from aitools.cache import DiskCache
 
 # This is the number of pages that have to be retrieved
 # by search_query to consider the query "expensive".
 EXP_THOLD = 4
+# Default number of pages fetched concurrently by search_query
+# once a query has been considered expensive.
+MAX_PARALLEL_PAGES = 4
+# Models that can be bulk-loaded by prefetch_models, mapped to
+# the endpoint listing them and the field their ids are resolved by
+# (the search_key their __resolve_<model>_id method uses).
+PREFETCHABLE_MODELS = {
+    'architecture': ('architectures', 'name'),
+    'environment': ('environments', 'name'),
+    'hostgroup': ('hostgroups', 'label'),
+    'medium': ('media', 'name'),
+    'operatingsystem': ('operatingsystems', 'title'),
+    'ptable': ('ptables', 'name'),
+    'user': ('users', 'login'),
+}
+# Page size used to sweep tables when prefetching.
+PREFETCH_PER_PAGE = 1000
 
 class ForemanClient(HTTPClient):
 
-    def __init__(self, host=None, port=None, timeout=None, dryrun=False, deref_alias=False):
+    def __init__(self, host=None, port=None, timeout=None, dryrun=False, deref_alias=False,
+            max_parallel_pages=None, cache_ttl=None):
         """
         Foreman client for interacting with the Foreman service. Autoconfigures via the AiConfig
         object.
@@ -34,14 +54,24 @@ class ForemanClient(HTTPClient):
         :param timeout: override the auto-configured Foreman timeout
         :param dryrun: create a dummy client
         :param deref_alias: resolve dns load balanced aliases
+        :param max_parallel_pages: override the auto-configured number of pages
+          fetched concurrently for expensive searches
+        :param cache_ttl: override the auto-configured lifetime (in seconds) of
+          the on-disk cache of names resolved into ids (0 disables it)
         """
         fmconfig = ForemanConfig()
         self.host = host or fmconfig.foreman_hostname
         self.port = int(port or fmconfig.foreman_port)
         self.timeout = int(timeout or fmconfig.foreman_timeout)
+        self.max_parallel_pages = int(max_parallel_pages or
+            getattr(fmconfig, 'foreman_max_parallel_pages', MAX_PARALLEL_PAGES))
         self.dryrun = dryrun
         self.deref_alias = deref_alias
         self.cache = {}
+        if cache_ttl is None:
+            cache_ttl = getattr(fmconfig, 'foreman_cache_ttl', 0)
+        self.disk_cache = DiskCache('foreman', cache_ttl)
+        self.disk_hits = set()
 
     def addhost(self, fqdn, environment, hostgroup, owner,
             managed=False, operatingsystem=None, medium=None,
@@ -84,6 +114,7 @@ class ForemanClient(HTTPClient):
             if code == requests.codes.created:
                 logging.info("Host '%s' created in Foreman" % fqdn)
             elif code == requests.codes.unprocessable_entity:
+                self.__invalidate_cached_models()
                 error = ','.join(body['error']['full_messages'])
                 raise AiToolsForemanError("addhost call failed (%s)" % error)
             else:
@@ -145,6 +176,7 @@ class ForemanClient(HTTPClient):
             elif code == requests.codes.not_found:
                 raise AiToolsForemanNotFoundError("Host '%s' not found in Foreman" % host['name'])
             elif code == requests.codes.unprocessable_entity:
+                self.__invalidate_cached_models()
                 error = ','.join(body['error']['full_messages'])
                 raise AiToolsForemanError(error)
             else:
@@ -504,6 +536,8 @@ class ForemanClient(HTTPClient):
                                              "hostgroups/%s" % (hgid))
 
         if code != requests.codes.ok:
+            if code in (requests.codes.not_found, requests.codes.unprocessable_entity):
+                self.__invalidate_cached_models()
             raise AiToolsForemanError("Could not delete hostgroup '%s'" % hostgroup)
 
         logging.info("Hostgroup '%s' removed" % hostgroup)
@@ -555,8 +589,10 @@ class ForemanClient(HTTPClient):
             params = body['results']
             return params
         elif code == requests.codes.not_found:
+            self.__invalidate_cached_models()
             raise AiToolsForemanNotFoundError("Hostgroup '%s' not found in Foreman" % hostgroup)
         elif code == requests.codes.unprocessable_entity:
+            self.__invalidate_cached_models()
             raise AiToolsForemanError("gethostgroupparamters call failed")
 
     def addhostgroupparameter(self, hostgroup, name, value):
@@ -590,6 +626,7 @@ class ForemanClient(HTTPClient):
                 if code == requests.codes.ok:
                     logging.info("Parameter '%s' updated in Foreman" % name)
                 elif code == requests.codes.not_found:
+                    self.__invalidate_cached_models()
                     raise AiToolsForemanNotFoundError("HostgroupID '%s' not found in Foreman" % hgid)
             else:
                 logging.info("Parameter '%s' not added because dryrun is enabled" % name)
@@ -607,6 +644,7 @@ class ForemanClient(HTTPClient):
                 if code == requests.codes.ok:
                     logging.info("Parameter '%s' created in Foreman" % name)
                 elif code == requests.codes.not_found:
+                    self.__invalidate_cached_models()
                     raise AiToolsForemanNotFoundError("HostgroupID '%s' not found in Foreman" % hgid)
             else:
                 logging.info("Parameter '%s' not added because dryrun is enabled" % name)
@@ -884,6 +922,35 @@ class ForemanClient(HTTPClient):
             raise AiToolsForemanNotFoundError("%s '%s' not found in Foreman" % \
                     (model, name))
 
+    def prefetch_models(self, models, per_page=PREFETCH_PER_PAGE):
+        """
+        Loads whole lookup tables from Foreman in a single paged sweep each
+        and indexes them by name, so that resolving names into ids later on
+        doesn't need any extra round trip. Names matching several records
+        are not indexed, so the lookup still fails as it should.
+
+        :param models: list of models to load (see PREFETCHABLE_MODELS)
+        :param per_page: page size to use when listing the tables
+        :return: the number of names indexed
+        :raise AiToolsForemanError: if a model is unknown or can't be listed
+        """
+        indexed = 0
+        for modelname in models:
+            if modelname not in PREFETCHABLE_MODELS:
+                raise AiToolsForemanError("Model '%s' can't be prefetched" % modelname)
+            model_endpoint, search_key = PREFETCHABLE_MODELS[modelname]
+            logging.debug("Prefetching %s from Foreman..." % model_endpoint)
+            ids = {}
+            for record in self.iter_search(model_endpoint, '', per_page=per_page):
+                # Left to the resolver if the listing doesn't have the field
+                if search_key in record:
+                    ids.setdefault(record[search_key], []).append(record['id'])
+            for name, matches in ids.iteritems():
+                if len(matches) == 1:
+                    self.cache['%s_%s_id' % (modelname, name)] = matches[0]
+                    indexed = indexed + 1
+        return indexed
+
     def __resolve_environment_id(self, name):
         return self.__resolve_model_id('environment', name)
 
@@ -912,69 +979,157 @@ class ForemanClient(HTTPClient):
         if cache_key in self.cache:
             logging.debug("'%s' found in cache" % cache_key)
             return self.cache[cache_key]
-        else:
-            logging.debug("Asking Foreman for %s '%s'" %
+        # Filtered lookups can't be identified by a key, so they're
+        # never stored on disk.
+        if results_filter is None:
+            cached = self.__get_from_disk_cache(cache_key)
+            if cached is not None:
+                return cached
+        logging.debug("Asking Foreman for %s '%s'" %
+            (modelname, value))
+        search_string_value = value
+        if value_filter is not None:
+            search_string_value = value_filter(value)
+        search_string = "%s=\"%s\"" % (search_key, search_string_value)
+        model_endpoint = "%ss" % modelname
+        if modelname == 'medium':
+            model_endpoint = "media"
+        results = self.search_query(model_endpoint, search_string)
+        if results_filter:
+            results = filter(results_filter, results)
+        if not results:
+            raise AiToolsForemanNotFoundError("%s '%s' not found" %
                 (modelname, value))
-            search_string_value = value
-            if value_filter is not None:
-                search_string_value = value_filter(value)
-            search_string = "%s=\"%s\"" % (search_key, search_string_value)
-            model_endpoint = "%ss" % modelname
-            if modelname == 'medium':
-                model_endpoint = "media"
-            results = self.search_query(model_endpoint, search_string)
-            if results_filter:
-                results = filter(results_filter, results)
-            if not results:
-                raise AiToolsForemanNotFoundError("%s '%s' not found" %
-                    (modelname, value))
-            if len(results) > 1:
-                raise AiToolsForemanError("Multiple choices for %s lookup" % modelname)
-            self.cache[cache_key] = results[0]['id']
-            return results[0]['id']
+        if len(results) > 1:
+            raise AiToolsForemanError("Multiple choices for %s lookup" % modelname)
+        self.cache[cache_key] = results[0]['id']
+        if results_filter is None:
+            self.disk_cache.set(self.__disk_cache_key(cache_key), results[0]['id'])
+        return results[0]['id']
 
     def __resolve_model(self, modelname, model_id):
         cache_key = '%s_%s' % (modelname, model_id)
+        # Only kept for the life of the client: unlike ids, records change
+        # without any later request failing because of it
         if cache_key in self.cache:
             logging.debug("'%s' found in cache" % cache_key)
             return self.cache[cache_key]
+        logging.debug("Asking Foreman for %s with id '%s'" %
+            (modelname, model_id))
+        (code, body) = self.__do_api_request("get", "%ss/%s" % (modelname, model_id))
+        if code == requests.codes.ok:
+            self.cache[cache_key] = body
+            return body
+        elif code == requests.codes.not_found:
+            raise AiToolsForemanError("Model '%s' not found in Foreman" % modelname)
+        elif code == requests.codes.unprocessable_entity:
+            error = ','.join(body['error']['full_messages'])
+            raise AiToolsForemanError("__resolve_model_name call failed (%s)" % error)
+
+    def __disk_cache_key(self, cache_key):
+        return "%s|%s" % (self.host, cache_key)
+
+    def __get_from_disk_cache(self, cache_key):
+        cached = self.disk_cache.get(self.__disk_cache_key(cache_key))
+        if cached is not None:
+            logging.debug("'%s' found in disk cache" % cache_key)
+            self.cache[cache_key] = cached
+            self.disk_hits.add(cache_key)
+        return cached
+
+    def __invalidate_cached_models(self):
+        """
+        Drops everything that was served from the disk cache during the
+        life of this client, as Foreman complained about some id and it
+        might have been a stale one.
+        """
+        for cache_key in list(self.disk_hits):
+            logging.debug("Invalidating cached '%s'" % cache_key)
+            self.cache.pop(cache_key, None)
+            self.disk_cache.delete(self.__disk_cache_key(cache_key))
+            self.disk_hits.discard(cache_key)
+
+    def search_query(self, model, search_string, per_page=None):
+        """
+        Runs a search query against the given model, walking through all the
+        pages of results. If the query is expensive (more than EXP_THOLD pages)
+        the remaining pages are fetched concurrently, up to max_parallel_pages
+        at a time.
+
+        :param model: the model endpoint to query ("hosts", "hostgroups"...)
+        :param search_string: a Foreman search filter
+        :param per_page: page size to request (default: Foreman's setting)
+        :return: the list of matching records, in the order returned by Foreman
+        :raise AiToolsForemanError: if any of the pages could not be retrieved
+        """
+        query_string = urllib.urlencode({'search': search_string})
+        payload = self.__get_search_page(model, query_string, 1, per_page)
+        results = payload['results']
+        pages = int(math.ceil(payload['subtotal']/float(payload['per_page'])))
+        if pages <= 1:
+            return results
+
+        remaining = xrange(2, pages + 1)
+        fetch = lambda page: self.__get_search_page(model, query_string, page, per_page)
+        if payload['subtotal'] <= EXP_THOLD * payload['per_page']:
+            for page in remaining:
+                results.extend(fetch(page)['results'])
+            return results
+
+        logging.warn("Crikey! That's an expensive query! this might take a while...")
+        print_progress_meter(1, pages)
+        workers = min(self.max_parallel_pages, len(remaining))
+        if workers > 1:
+            logging.debug("Fetching %d pages using %d workers" %
+                (len(remaining), workers))
+            pool = ThreadPool(processes=workers)
+            try:
+                # imap keeps the results in page order
+                for page, payload in enumerate(pool.imap(fetch, remaining), 2):
+                    results.extend(payload['results'])
+                    print_progress_meter(page, pages)
+            finally:
+                pool.terminate()
         else:
-            logging.debug("Asking Foreman for %s with id '%s'" %
-                (modelname, model_id))
-            (code, body) = self.__do_api_request("get", "%ss/%s" % (modelname, model_id))
-            if code == requests.codes.ok:
-                self.cache[cache_key] = body
-                return body
-            elif code == requests.codes.not_found:
-                raise AiToolsForemanError("Model '%s' not found in Foreman" % modelname)
-            elif code == requests.codes.unprocessable_entity:
-                error = ','.join(body['error']['full_messages'])
-                raise AiToolsForemanError("__resolve_model_name call failed (%s)" % error)
+            for page in remaining:
+                results.extend(fetch(page)['results'])
+                print_progress_meter(page, pages)
+        print_progress_meter(1, 1, new_line=True)
+        return results
 
-    def search_query(self, model, search_string):
+    def iter_search(self, model, search_string, per_page=None):
+        """
+        Generator version of search_query. Records are yielded as soon as
+        the page containing them arrives, and only one page is kept in
+        memory at a time.
+
+        :param model: the model endpoint to query ("hosts", "hostgroups"...)
+        :param search_string: a Foreman search filter
+        :param per_page: page size to request (default: Foreman's setting).
+          Bigger pages mean less round trips.
+        :return: a generator of matching records
+        :raise AiToolsForemanError: if any of the pages could not be retrieved
+        """
         query_string = urllib.urlencode({'search': search_string})
         page = 1
-        results = []
-        expensive_query = False
-        while page == 1 or page <= math.ceil(payload['subtotal']/float(payload['per_page'])):
-            url = "%s/?%s&page=%d" % (model, query_string, page)
-            (code, payload) = self.__do_api_request("get", url)
-            if code == requests.codes.ok:
-                if page == 1 and payload['subtotal'] > EXP_THOLD * payload['per_page']:
-                    logging.warn("Crikey! That's an expensive query! this might take a while...")
-                    expensive_query = True
-                if expensive_query:
-                    print_progress_meter(page,
-                        math.ceil(payload['subtotal']/float(payload['per_page'])))
-                results.extend(payload['results'])
-                page = page + 1
-            else:
-                msg = "Foreman didn't return a controlled status code when looking up %s" \
-                    % model
-                raise AiToolsForemanError(msg)
-        if expensive_query:
-            print_progress_meter(1, 1, new_line=True)
-        return results
+        while True:
+            payload = self.__get_search_page(model, query_string, page, per_page)
+            for record in payload['results']:
+                yield record
+            if page >= math.ceil(payload['subtotal']/float(payload['per_page'])):
+                break
+            page = page + 1
+
+    def __get_search_page(self, model, query_string, page, per_page=None):
+        url = "%s/?%s&page=%d" % (model, query_string, page)
+        if per_page:
+            url = "%s&per_page=%d" % (url, per_page)
+        (code, payload) = self.__do_api_request("get", url)
+        if code != requests.codes.ok:
+            msg = "Foreman didn't return a controlled status code when looking up %s" \
+                % model
+            raise AiToolsForemanError(msg)
+        return payload
 
     def __do_api_request(self, method, url, data=None, prefix="api/"):
         url = "https://%s:%u/%s%s" % (self.host, self.port, prefix, url)
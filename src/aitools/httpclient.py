@@ -1,9 +1,16 @@
 import logging
+import threading
 import requests
-from requests_kerberos import HTTPKerberosAuth, OPTIONAL
+try:
+    import simplejson as json
+except ImportError:
+    import json
+from requests.adapters import HTTPAdapter
 
 from aitools.params import CERN_CA_BUNDLE
+from aitools.params import DEFAULT_HTTP_POOL_SIZE
 from aitools.errors import AiToolsHTTPClientError
+from aitools.config import AiConfig
 
 class HTTPClient(object):
 
@@ -13,8 +20,54 @@ class HTTPClient(object):
         """
         assert False  # subclass it
 
+    # Number of keep-alive connections kept per remote host. If None,
+    # 'http_pool_size' from the configuration file is used.
+    pool_size = None
 
-    def do_request(self, method, url, headers, data=None):
+    __session_lock = threading.Lock()
+
+    def get_session(self):
+        """
+        Returns the requests.Session owned by this client, creating it
+        on first use. The session keeps connections alive and pooled
+        per remote host so consecutive calls don't pay a new TCP and
+        TLS handshake. It's safe to share it between threads.
+
+        :return: a requests.Session object
+        """
+        with HTTPClient.__session_lock:
+            session = self.__dict__.get('_session', None)
+            if session is None:
+                pool_size = self.__get_pool_size()
+                logging.debug("Creating HTTP session (pool size: %d)" % pool_size)
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=pool_size,
+                    pool_maxsize=pool_size)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                self._session = session
+                self._auth = threading.local()
+            return session
+
+    def get_auth(self):
+        """
+        Returns the Kerberos auth handler of the calling thread. Kerberos
+        contexts can't be shared between threads, so each thread gets
+        its own handler, which is reused for all the requests issued by
+        that thread.
+
+        :return: a HTTPKerberosAuth object
+        """
+        self.get_session()
+        auth = getattr(self._auth, 'handler', None)
+        if auth is None:
+            # Loads the Kerberos libraries, only needed from here on
+            from requests_kerberos import HTTPKerberosAuth
+            auth = HTTPKerberosAuth()
+            self._auth.handler = auth
+        return auth
+
+    def do_request(self, method, url, headers, data=None, stream=False):
         # turn off silly requests_kerberos errors
         requests_log = logging.getLogger("requests_kerberos.kerberos_")
         requests_log.setLevel(logging.CRITICAL)
@@ -24,21 +77,65 @@ class HTTPClient(object):
             logging.debug("With data: %s" % data)
 
         try:
-            caller = getattr(requests, method)
+            caller = getattr(self.get_session(), method)
+            auth = self.get_auth()
             response = caller(url, timeout=self.timeout,
-                headers=headers, auth=HTTPKerberosAuth(),
+                headers=headers, auth=auth,
                 verify=CERN_CA_BUNDLE, allow_redirects=True,
-                data=data)
-            logging.debug("Returned (%s) %s",
-                            response.status_code, response.text)
+                data=data, stream=stream)
+            if stream:
+                # Reading the body here would defeat the purpose
+                logging.debug("Returned (%s), streaming body", response.status_code)
+            elif logging.getLogger().isEnabledFor(logging.DEBUG):
+                # response.text decodes the whole body, so only when needed
+                logging.debug("Returned (%s) %s",
+                                response.status_code, response.text)
             # if response.status_code == requests.codes.forbidden or \
             #     response.status_code == requests.codes.unauthorized:
             #         raise AiToolsHTTPClientError("Authentication failed (expired or non-existent TGT?)")
             if response.status_code == requests.codes.internal_server_error:
                 raise AiToolsHTTPClientError("Internal Server Error")
+            if response.status_code != requests.codes.unauthorized:
+                # The negotiation went through, so from now on the
+                # token is sent upfront saving the 401 round trip.
+                auth.force_preemptive = True
         except requests.exceptions.ConnectionError, error:
             raise AiToolsHTTPClientError("Connection error (%s)" % error)
         except requests.exceptions.Timeout, error:
             raise AiToolsHTTPClientError("Connection timeout")
 
         return (response.status_code, response)
+
+    def decode_json(self, response):
+        """
+        Parses the JSON body of a response straight from the (already
+        decompressed) bytes received. Unlike response.json() it doesn't
+        build an intermediate Unicode copy of the whole body nor tries to
+        guess its encoding, as JSON is always UTF-8.
+
+        :param response: a requests.Response object
+        :return: the parsed structure
+        :raise ValueError: if the body is not valid JSON
+        """
+        return json.loads(response.content)
+
+    def ensure_pool_size(self, connections):
+        """
+        Makes the connection pool big enough for the given number of
+        concurrent requests, e.g. from as many threads sharing this
+        client. A bigger configured pool is left as it is. Only has
+        effect before the session is created, i.e. before the first
+        request.
+
+        :param connections: number of requests that may run at once
+        """
+        if connections > self.__get_pool_size():
+            self.pool_size = connections
+
+    def __get_pool_size(self):
+        if self.pool_size:
+            return int(self.pool_size)
+        try:
+            return int(AiConfig().http_pool_size)
+        except (AttributeError, ValueError):
+            return DEFAULT_HTTP_POOL_SIZE
@@ -0,0 +1,242 @@
+import os
+import re
+import time
+import errno
+import logging
+import sqlite3
+import datetime
+from dateutil import tz
+from dateutil import parser as duparser
+
+from aitools.errors import AiToolsInventoryError
+from aitools.cache import get_cache_path
+
+# Host attributes mirrored from Foreman, as returned by the hosts endpoint.
+INVENTORY_FIELDS = ['name', 'hostgroup_name', 'hostgroup_title',
+    'environment_name', 'operatingsystem_name', 'architecture_name',
+    'model_name', 'ptable_name', 'comment', 'enabled', 'last_report',
+    'updated_at']
+# Incremental syncs can't notice hosts removed from Foreman, so the
+# whole table is downloaded again if the last full sync is older than this.
+FULL_SYNC_INTERVAL = 24 * 3600
+# Maximum number of hostnames passed to a single SQL statement
+# (SQLite refuses more than 999 parameters).
+MAX_NAMES_PER_QUERY = 500
+# Format timestamps are stored in. It's always UTC so lexicographic
+# order matches chronological order.
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+# Page size used to download hosts from Foreman, so a full sync takes
+# a few dozen requests instead of thousands of default-sized pages.
+SYNC_PER_PAGE = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hosts (
+    name TEXT PRIMARY KEY,
+    hostgroup_name TEXT,
+    hostgroup_title TEXT,
+    environment_name TEXT,
+    operatingsystem_name TEXT,
+    architecture_name TEXT,
+    model_name TEXT,
+    ptable_name TEXT,
+    comment TEXT,
+    enabled INTEGER,
+    last_report TEXT,
+    updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS hosts_hostgroup_title ON hosts (hostgroup_title);
+CREATE INDEX IF NOT EXISTS hosts_last_report ON hosts (last_report);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+class Inventory(object):
+
+    def __init__(self, foreman, path=None):
+        """
+        Local snapshot of the hosts registered in Foreman, stored in a
+        SQLite file so read-only queries can be answered without contacting
+        Foreman. The snapshot is refreshed incrementally by only fetching
+        the hosts updated since the previous sync.
+
+        :param foreman: the ForemanClient used to refresh the snapshot
+        :param path: override the location of the SQLite file
+        """
+        self.foreman = foreman
+        self.path = path or os.path.join(get_cache_path('inventory'),
+            "%s.sqlite" % foreman.host)
+        self.__connection = None
+
+    def age(self):
+        """
+        Returns the number of seconds elapsed since the last successful
+        sync or None if the snapshot has never been synced.
+        """
+        synced_at = self.__get_meta('synced_at')
+        if synced_at is None:
+            return None
+        return max(0, time.time() - float(synced_at))
+
+    def sync(self, full=False):
+        """
+        Brings the snapshot up to date. Only the hosts whose updated_at is
+        newer than the most recent one already stored are downloaded unless
+        the snapshot is empty, a full sync is requested or the last one is
+        older than FULL_SYNC_INTERVAL.
+
+        :param full: replace the whole snapshot
+        :return: the number of hosts downloaded
+        :raise AiToolsForemanError: if Foreman can't be queried
+        :raise AiToolsInventoryError: if the snapshot can't be written
+        """
+        watermark = self.__get_meta('watermark')
+        full_synced_at = float(self.__get_meta('full_synced_at') or 0)
+        if time.time() - full_synced_at > FULL_SYNC_INTERVAL:
+            full = True
+        started = time.time()
+        if full or watermark is None:
+            logging.debug("Downloading all hosts from Foreman")
+            hosts = self.foreman.search_query("hosts", "", per_page=SYNC_PER_PAGE)
+            full = True
+        else:
+            since = datetime.datetime.strptime(watermark, TIMESTAMP_FORMAT)
+            query = "updated_at >= \"%s UTC\"" % since.strftime("%Y-%m-%d %H:%M:%S")
+            logging.debug("Downloading hosts updated since %s", watermark)
+            hosts = self.foreman.search_query("hosts", query, per_page=SYNC_PER_PAGE)
+
+        rows = [self.__row_from_host(host) for host in hosts]
+        try:
+            connection = self.__connect()
+            with connection:
+                if full:
+                    connection.execute("DELETE FROM hosts")
+                connection.executemany("INSERT OR REPLACE INTO hosts (%s) VALUES (%s)" %
+                    (", ".join(INVENTORY_FIELDS), ", ".join(["?"] * len(INVENTORY_FIELDS))),
+                    rows)
+                updated = [row[-1] for row in rows if row[-1]]
+                if updated:
+                    self.__set_meta(connection, 'watermark', max(updated + [watermark or '']))
+                self.__set_meta(connection, 'synced_at', started)
+                if full:
+                    self.__set_meta(connection, 'full_synced_at', started)
+        except sqlite3.Error, error:
+            raise AiToolsInventoryError("Couldn't update the inventory (%s)" % error)
+        logging.debug("%d hosts stored in '%s'", len(rows), self.path)
+        return len(rows)
+
+    def search(self, hostgroup=None, hostgroup_like=None, names=None,
+            reported_before=None, reported_after=None, enabled=None):
+        """
+        Returns the hosts in the snapshot matching all the given criteria,
+        as dictionaries with the same keys Foreman uses.
+
+        :param hostgroup: full name of the hostgroup the hosts belong to
+        :param hostgroup_like: part of the full name of the hostgroup,
+          matched case-insensitively like Foreman's ~ operator does
+        :param names: list of hostnames to restrict the search to
+        :param reported_before: datetime the last report must be older than
+        :param reported_after: datetime the last report must be newer than
+        :param enabled: only hosts with reporting enabled (or disabled)
+        :return: a list of dictionaries
+        :raise AiToolsInventoryError: if the snapshot can't be read
+        """
+        clauses, params = [], []
+        if hostgroup is not None:
+            clauses.append("hostgroup_title = ?")
+            params.append(hostgroup)
+        if hostgroup_like:
+            clauses.append("hostgroup_title LIKE ? ESCAPE '\\'")
+            params.append("%%%s%%" % re.sub(r'([\\%_])', r'\\\1', hostgroup_like))
+        if reported_before is not None:
+            clauses.append("(last_report IS NULL OR last_report < ?)")
+            params.append(_format_timestamp(reported_before))
+        if reported_after is not None:
+            clauses.append("last_report > ?")
+            params.append(_format_timestamp(reported_after))
+        if enabled is not None:
+            clauses.append("enabled = ?")
+            params.append(int(enabled))
+
+        if names is None:
+            return self.__select(clauses, params)
+        hosts = []
+        names = list(names)
+        for ii in xrange(0, len(names), MAX_NAMES_PER_QUERY):
+            chunk = names[ii:ii+MAX_NAMES_PER_QUERY]
+            hosts.extend(self.__select(clauses +
+                ["name IN (%s)" % ", ".join(["?"] * len(chunk))], params + chunk))
+        return hosts
+
+    def __select(self, clauses, params):
+        query = "SELECT %s FROM hosts" % ", ".join(INVENTORY_FIELDS)
+        if clauses:
+            query = "%s WHERE %s" % (query, " AND ".join(clauses))
+        try:
+            cursor = self.__connect().execute("%s ORDER BY name" % query, params)
+            return [self.__host_from_row(row) for row in cursor]
+        except sqlite3.Error, error:
+            raise AiToolsInventoryError("Couldn't query the inventory (%s)" % error)
+
+    def __connect(self):
+        if self.__connection is None:
+            directory = os.path.dirname(self.path)
+            try:
+                if directory and not os.path.isdir(directory):
+                    os.makedirs(directory, 0700)
+            except OSError, error:
+                if error.errno != errno.EEXIST:
+                    raise AiToolsInventoryError("Couldn't create '%s' (%s)" %
+                        (directory, error))
+            try:
+                # Several processes may sync at the same time
+                self.__connection = sqlite3.connect(self.path, timeout=30)
+                self.__connection.executescript(SCHEMA)
+            except sqlite3.Error, error:
+                raise AiToolsInventoryError("Couldn't open '%s' (%s)" %
+                    (self.path, error))
+        return self.__connection
+
+    def __get_meta(self, key):
+        if self.__connection is None and not os.path.exists(self.path):
+            return None
+        try:
+            row = self.__connect().execute("SELECT value FROM meta WHERE key = ?",
+                (key,)).fetchone()
+        except sqlite3.Error, error:
+            raise AiToolsInventoryError("Couldn't query the inventory (%s)" % error)
+        return row[0] if row else None
+
+    def __set_meta(self, connection, key, value):
+        connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            (key, str(value)))
+
+    def __row_from_host(self, host):
+        row = [host.get(field, None) for field in INVENTORY_FIELDS]
+        row[INVENTORY_FIELDS.index('enabled')] = int(bool(host.get('enabled', True)))
+        if not host.get('hostgroup_title', None):
+            row[INVENTORY_FIELDS.index('hostgroup_title')] = host.get('hostgroup_name', None)
+        for field in ('last_report', 'updated_at'):
+            index = INVENTORY_FIELDS.index(field)
+            row[index] = _normalize_timestamp(row[index])
+        return row
+
+    def __host_from_row(self, row):
+        host = dict(zip(INVENTORY_FIELDS, row))
+        host['enabled'] = bool(host['enabled'])
+        return host
+
+def _normalize_timestamp(value):
+    if not value:
+        return None
+    try:
+        return _format_timestamp(duparser.parse(value))
+    except ValueError:
+        logging.debug("Ignoring unparseable timestamp '%s'", value)
+        return None
+
+def _format_timestamp(value):
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=tz.tzutc())
+    return value.astimezone(tz.tzutc()).strftime(TIMESTAMP_FORMAT)
@@ -3,15 +3,10 @@
 
 import logging
 import getpass
-import suds
-
-from suds.sax.element import Element
-from suds.xsd.doctor import ImportDoctor, Import
-from suds import WebFault
-from suds import null
 
 from aitools.config import LandbConfig
 from aitools.common import shortify
+from aitools.common import LazyModule
 
 from aitools.errors import AiToolsLandbError
 from aitools.errors import AiToolsLandbInitError
@@ -19,6 +14,11 @@ from aitools.errors import AiToolsLandbInitError
 WSDL_URL = 'https://network.cern.ch/sc/soap/soap.fcgi?v=5&WSDL'
 XMLSOAP_SCHEMA_URL = 'http://schemas.xmlsoap.org/soap/encoding/'
 
+suds = LazyModule('suds')
+suds_client = LazyModule('suds.client')
+suds_doctor = LazyModule('suds.xsd.doctor')
+suds_element = LazyModule('suds.sax.element')
+
 class LandbClient():
 
     def __init__(self, username, password, host=None, port=None, dryrun=False):
@@ -46,16 +46,17 @@ class LandbClient():
         self.__init_soap_client()
 
     def __init_soap_client(self):
-        self.client = suds.client.Client(WSDL_URL,
-            doctor=ImportDoctor(Import(XMLSOAP_SCHEMA_URL)), cache=None)
+        self.client = suds_client.Client(WSDL_URL,
+            doctor=suds_doctor.ImportDoctor(suds_doctor.Import(XMLSOAP_SCHEMA_URL)),
+            cache=None)
 
         try:
             token = self.client.service.getAuthToken(self.username,
                 self.password , 'CERN')
-        except WebFault, error:
+        except suds.WebFault, error:
             raise AiToolsLandbInitError(error)
-        authTok = Element('token').setText(token)
-        auth_header = Element('Auth').insert(authTok)
+        authTok = suds_element.Element('token').setText(token)
+        auth_header = suds_element.Element('Auth').insert(authTok)
         self.client.set_options(soapheaders=auth_header)
 
     def change_responsible(self, fqdn, name, firstname=None):
@@ -63,7 +64,7 @@ class LandbClient():
         hostname = shortify(fqdn)
         try:
             device = self.client.service.getDeviceInfo(hostname)
-        except WebFault, error:
+        except suds.WebFault, error:
             logging.debug(error)
             raise AiToolsLandbError("getDeviceInfo failed (%s)" % error)
 
@@ -73,8 +74,8 @@ class LandbClient():
         else:
             new_responsible.FirstName = firstname.upper()
         new_responsible.Name = name.upper()
-        new_responsible.Department = null()
-        new_responsible.Group = null()
+        new_responsible.Department = suds.null()
+        new_responsible.Group = suds.null()
 
         logging.debug("Current responsible: %s", device.ResponsiblePerson)
         logging.debug("New responsible: %s", new_responsible)
@@ -87,6 +88,6 @@ class LandbClient():
         logging.debug("Calling deviceUpdate...")
         try:
             self.client.service.deviceUpdate(hostname, device)
-        except WebFault, error:
+        except suds.WebFault, error:
             logging.debug(error)
             raise AiToolsLandbError("getDeviceInfo failed (%s)" % error)
@@ -3,15 +3,17 @@
 
 import re
 import logging
-import novaclient.exceptions
 import requests
 import dateutil.parser
-from novaclient import client
 from aitools.config import NovaConfig
 from aitools.common import is_valid_UUID
+from aitools.common import LazyModule
 
 from aitools.errors import AiToolsNovaError
 
+client = LazyModule('novaclient.client')
+nova_exceptions = LazyModule('novaclient.exceptions')
+
 NOVA_API_VERSION = 2
 
 class NovaClient():
@@ -66,9 +68,9 @@ class NovaClient():
                 logging.info("VM '%s' not created because dryrun is enabled" % vmname)
         except requests.exceptions.Timeout, error:
             raise AiToolsNovaError(error)
-        except novaclient.exceptions.ClientException, error:
+        except nova_exceptions.ClientException, error:
             raise AiToolsNovaError(error)
-        except novaclient.exceptions.ConnectionRefused, error:
+        except nova_exceptions.ConnectionRefused, error:
             raise AiToolsNovaError(error)
 
     def rebuild(self, fqdn, image=None):
@@ -98,9 +100,9 @@ class NovaClient():
                 logging.info("VM '%s' not rebuilt because dryrun is enabled" % vmname)
         except requests.exceptions.Timeout, error:
             raise AiToolsNovaError(error)
-        except novaclient.exceptions.ClientException, error:
+        except nova_exceptions.ClientException, error:
             raise AiToolsNovaError(error)
-        except novaclient.exceptions.ConnectionRefused, error:
+        except nova_exceptions.ConnectionRefused, error:
             raise AiToolsNovaError(error)
 
     def delete(self, fqdn):
@@ -123,9 +125,9 @@ class NovaClient():
                 logging.info("VM '%s' not deleted because dryrun is enabled" % vmname)
         except requests.exceptions.Timeout, error:
             raise AiToolsNovaError(error)
-        except novaclient.exceptions.ClientException, error:
+        except nova_exceptions.ClientException, error:
             raise AiToolsNovaError(error)
-        except novaclient.exceptions.ConnectionRefused, error:
+        except nova_exceptions.ConnectionRefused, error:
             raise AiToolsNovaError(error)
 
     def find_image_by_name(self, name):
@@ -134,9 +136,9 @@ class NovaClient():
             return self.__resolve_id(tenant.images.list(), name)
         except requests.exceptions.Timeout, error:
             raise AiToolsNovaError(error)
-        except novaclient.exceptions.ClientException, error:
+        except nova_exceptions.ClientException, error:
             raise AiToolsNovaError(error)
-        except novaclient.exceptions.ConnectionRefused, error:
+        except nova_exceptions.ConnectionRefused, error:
             raise AiToolsNovaError(error)
 
     def get_latest_image(self, os_distro, os_distro_major, os_edition='Base',
@@ -166,8 +168,8 @@ class NovaClient():
                 "" % (latest.get('name') or latest['id'], os_distro, os_distro_major))
             return latest['id']
 
-        except (requests.exceptions.Timeout, novaclient.exceptions.ClientException,
-            novaclient.exceptions.ConnectionRefused) as error:
+        except (requests.exceptions.Timeout, nova_exceptions.ClientException,
+            nova_exceptions.ConnectionRefused) as error:
             raise AiToolsNovaError(error)
 
     def __init_client(self):
@@ -176,9 +178,9 @@ class NovaClient():
                 self.nova = client.Client(NOVA_API_VERSION, username='', api_key='',
                     project_id='', auth_url='', timeout=self.timeout,
                     session=self.auth_client.session)
-            except novaclient.exceptions.ClientException, error:
+            except nova_exceptions.ClientException, error:
                 raise AiToolsNovaError(error)
-            except novaclient.exceptions.ConnectionRefused, error:
+            except nova_exceptions.ConnectionRefused, error:
                 raise AiToolsNovaError(error)
         return self.nova
 
@@ -4,16 +4,17 @@
 import logging
 import requests
 import re
-from keystoneauth1 import session as keystone_session
-from keystoneauth1 import exceptions as ka_exceptions
-from keystoneclient.v3 import client as keystoneclient
-from openstackclient.api import auth
-from openstackclient.common import clientmanager
-from os_client_config import config as cloud_config
-from keystoneclient import exceptions as ks_exceptions
+from aitools.common import LazyModule
 from aitools.errors import AiToolsOpenstackAuthError
 from aitools.errors import AiToolsOpenstackAuthBadEnvError
 
+keystone_session = LazyModule('keystoneauth1.session')
+ka_exceptions = LazyModule('keystoneauth1.exceptions')
+keystoneclient = LazyModule('keystoneclient.v3.client')
+auth = LazyModule('openstackclient.api.auth')
+cloud_config = LazyModule('os_client_config.config')
+ks_exceptions = LazyModule('keystoneclient.exceptions')
+
 class OpenstackAuthClient():
     def __init__(self, auth_options):
         """
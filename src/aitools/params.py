@@ -5,3 +5,8 @@ CERN_CA_BUNDLE = "/etc/ssl/certs/CERN-bundle.pem"
 FQDN_VALIDATION_RE = "^[a-zA-Z0-9][a-zA-Z0-9\-]{0,62}?(\.[a-zA-Z0-9]{1,63})*\.cern\.ch$"
 MAX_FQDN_LEN = 253
 HASHLEN = 10
+DEFAULT_HTTP_POOL_SIZE = 10
+# Compression schemes offered to the APIs (requests decodes them
+# transparently, also when streaming)
+ACCEPT_ENCODING = "gzip, deflate"
+CACHE_DIR = "~/.cache/ai-tools"
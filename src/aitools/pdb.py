@@ -1,6 +1,8 @@
 __author__ = 'mccance'
 
 import re
+import logging
+import json
 import requests
 import urllib
 
@@ -12,11 +14,19 @@ from aitools.httpclient import HTTPClient
 from aitools.config import PdbConfig
 from distutils.util import strtobool
 from aitools.common import deref_url
+from aitools.common import iter_json_array
+from aitools.common import split_by_query_length
+from aitools.params import ACCEPT_ENCODING
+from aitools.cache import DiskCache
+from aitools import pdbquery
 
+# Size of the pieces streamed responses are read in.
+STREAM_CHUNK_SIZE = 64 * 1024
 
 class PdbClient(HTTPClient):
 
-    def __init__(self, host=None, port=None, timeout=None, show_url=False, dryrun=False, deref_alias=False):
+    def __init__(self, host=None, port=None, timeout=None, show_url=False, dryrun=False, deref_alias=False,
+            fact_cache_ttl=None):
         """
         PuppetDB client for interacting with the PuppetDB service. Autoconfigures via the AiConfig
         object.
@@ -27,6 +37,8 @@ class PdbClient(HTTPClient):
         :param show_url: print the URLs used to sys.stdout
         :param dryrun: create a dummy client
         :param deref_alias: resolve dns load balanced aliases
+        :param fact_cache_ttl: override the auto-configured lifetime (in seconds)
+          of the on-disk cache of host facts (0 disables it)
         """
         pdbcondfig = PdbConfig()
         self.host = host or pdbcondfig.pdb_hostname
@@ -36,6 +48,9 @@ class PdbClient(HTTPClient):
         self.show_url = show_url
         self.deref_alias = deref_alias
         self.cache = {}
+        if fact_cache_ttl is None:
+            fact_cache_ttl = getattr(pdbcondfig, 'pdb_fact_cache_ttl', 0)
+        self.fact_cache = DiskCache('pdb-facts', fact_cache_ttl)
 
     def get_host(self, hostname):
         """
@@ -54,13 +69,20 @@ class PdbClient(HTTPClient):
     def get_facts(self, hostname, fact=None):
         """
         Return all current facts (or a single fact, if specified) for the specified host, from
-        the /v4/nodes/[hostname]/facts/[fact] URL.
+        the /v4/nodes/[hostname]/facts/[fact] URL. If the fact cache is enabled, the facts
+        stored for the host are returned as long as its facts_timestamp in
+        /v4/nodes/[hostname] hasn't changed since they were downloaded.
 
         :param hostname: the hostname to query
         :param hostname: the fact to query, if present
         :return: dict of facts
         :raise AiToolsPdbError: in case the hostname is not found
         """
+        if self.fact_cache.enabled():
+            return self.__get_facts_cached(hostname, fact)
+        return self.__get_facts(hostname, fact)
+
+    def __get_facts(self, hostname, fact=None):
         host_endpoint = "v4/nodes/%s/facts/%s" % (hostname, fact or '')
         (code, body) = self.__do_api_request("get", host_endpoint)
         if code == requests.codes.not_found or not body:
@@ -72,6 +94,95 @@ class PdbClient(HTTPClient):
                 raise AiToolsPdbNotFoundError("Host '%s' not found in PuppetDB" % hostname)
         return dict([ (f['name'], f['value']) for f in body ])
 
+    def __get_factset(self, hostname):
+        # All the facts of a host along with the facts_timestamp they belong
+        # to, in a single request
+        query = pdbquery.dumps(pdbquery.equals("certname", hostname))
+        (code, body) = self.raw_request("v4/factsets", query)
+        if code != requests.codes.ok:
+            raise AiToolsPdbError("PuppetDB returned %s when querying the "
+                "factset of '%s'" % (code, hostname))
+        if not body:
+            raise AiToolsPdbNotFoundError("Host '%s' not found in PuppetDB" % hostname)
+        factset = body[0]
+        facts = factset.get('facts') or []
+        if isinstance(facts, dict):
+            # Expanded by PuppetDB, href and data
+            facts = facts.get('data') or []
+        return (factset.get('timestamp'),
+            dict([ (f['name'], f['value']) for f in facts ]))
+
+    def __get_facts_cached(self, hostname, fact=None):
+        cache_key = "%s|%s" % (self.host, hostname)
+        cached = self.fact_cache.get(cache_key)
+        if cached:
+            # Cheap request telling whether the facts changed
+            timestamp = self.get_host(hostname).get('facts_timestamp')
+            if timestamp and cached['facts_timestamp'] == timestamp:
+                logging.debug("Facts of '%s' found in cache" % hostname)
+                facts = cached['facts']
+                if not fact:
+                    return facts
+                if fact not in facts:
+                    raise AiToolsPdbNotFoundError("Host '%s' doesn't have fact '%s' in "
+                        "PuppetDB" % (hostname, fact))
+                return {fact: facts[fact]}
+        if fact:
+            # Not worth downloading (and caching) all the facts for one
+            return self.__get_facts(hostname, fact)
+        # Nothing to validate against, so no point in asking for the
+        # facts_timestamp first: the factset carries its own
+        timestamp, facts = self.__get_factset(hostname)
+        if timestamp:
+            self.fact_cache.set(cache_key,
+                {'facts_timestamp': timestamp, 'facts': facts})
+        return facts
+
+    def get_facts_bulk(self, hostnames, facts=None):
+        """
+        Return the current facts (or only the specified ones) of several hosts,
+        using as few requests to the /v4/facts URL as the maximum query length
+        allows.
+
+        :param hostnames: list of hostnames to query
+        :param facts: list of fact names to restrict the results to, if present
+        :return: dict mapping hostnames to dicts of facts. Hosts not found in
+            PuppetDB (or not having any of the facts) are not included
+        :raise AiToolsPdbError: in case PuppetDB can't be queried
+        """
+        result = {}
+        for query in self.__build_bulk_queries("certname", hostnames,
+                facts and pdbquery.in_("name", facts)):
+            (code, body) = self.raw_request("v4/facts", query)
+            if code != requests.codes.ok:
+                raise AiToolsPdbError("PuppetDB returned %s when querying facts "
+                    "in bulk" % code)
+            for fact in body:
+                result.setdefault(fact['certname'], {})[fact['name']] = fact['value']
+        return result
+
+    def get_hosts_bulk(self, hostnames):
+        """
+        Return the basic host info records of several hosts, using as few
+        requests to the /v4/nodes URL as the maximum query length allows.
+
+        :param hostnames: list of hostnames to query
+        :return: dict mapping hostnames to host info records (deactivated
+            hosts included). Hosts not found in PuppetDB are not included
+        :raise AiToolsPdbError: in case PuppetDB can't be queried
+        """
+        result = {}
+        # Like /v4/nodes/[hostname], which also returns deactivated nodes
+        for query in self.__build_bulk_queries("certname", hostnames,
+                pdbquery.equals("node_state", "any")):
+            (code, body) = self.raw_request("v4/nodes", query)
+            if code != requests.codes.ok:
+                raise AiToolsPdbError("PuppetDB returned %s when querying nodes "
+                    "in bulk" % code)
+            for node in body:
+                result[node['certname']] = node
+        return result
+
     def get_resources(self, hostname, resource):
         """
         Return the specificed resource record for the specified host, from the
@@ -110,28 +221,184 @@ class PdbClient(HTTPClient):
         json_lb = self.get_resources(hostname, "Lbd::Client")
         return [ l['parameters']['lbalias'] for l in json_lb ]
 
+    def get_resources_bulk(self, resource, hostnames=None, hostgroup=None,
+            subgroups=False):
+        """
+        Return the resources of a given type of several hosts, either the ones
+        in a list or the members of a hostgroup, querying the /v4/resources URL
+        as few times as possible (once for a hostgroup).
+
+        :param resource: the resource type to query (e.g. "Lbd::Client")
+        :param hostnames: list of hostnames to query
+        :param hostgroup: query the hosts of this hostgroup instead
+        :param subgroups: also query the hosts of the subgroups of hostgroup
+        :return: dict mapping hostnames to lists of resource records. When a
+            list of hostnames is given all of them are included
+        :raise AiToolsPdbError: in case PuppetDB can't be queried
+        """
+        condition = pdbquery.equals("type", resource)
+        if hostgroup is not None:
+            result = {}
+            queries = [pdbquery.dumps(pdbquery.and_(condition,
+                pdbquery.in_("certname", pdbquery.hostgroup_hosts(hostgroup, subgroups))))]
+        else:
+            result = dict([(hostname, []) for hostname in hostnames or []])
+            queries = self.__build_bulk_queries("certname", hostnames or [], condition)
+        for query in queries:
+            (code, body) = self.raw_request("v4/resources", query)
+            if code != requests.codes.ok:
+                raise AiToolsPdbError("PuppetDB returned %s when querying %s "
+                    "resources in bulk" % (code, resource))
+            for entry in body:
+                result.setdefault(entry['certname'], []).append(entry)
+        return result
+
+    def get_landbsets_bulk(self, hostnames=None, hostgroup=None, subgroups=False):
+        """
+        Return the LANDB sets of several hosts. See get_resources_bulk.
+
+        :return: dict mapping hostnames to (possibly empty) lists of LANDB sets
+        :raise AiToolsPdbError: in case PuppetDB can't be queried
+        """
+        resources = self.get_resources_bulk("Cernfw::Landbset", hostnames,
+            hostgroup, subgroups)
+        return dict([(hostname, [j['title'] for j in entries])
+            for (hostname, entries) in resources.items()])
+
+    def get_lbaliases_bulk(self, hostnames=None, hostgroup=None, subgroups=False):
+        """
+        Return the DNS load-balanced aliases of several hosts. See
+        get_resources_bulk.
+
+        :return: dict mapping hostnames to (possibly empty) lists of DNS aliases
+        :raise AiToolsPdbError: in case PuppetDB can't be queried
+        """
+        resources = self.get_resources_bulk("Lbd::Client", hostnames,
+            hostgroup, subgroups)
+        return dict([(hostname, [l['parameters']['lbalias'] for l in entries])
+            for (hostname, entries) in resources.items()])
+
     def raw_request(self, url, query=None):
         if query:
             url = "%s?%s" % (url, urllib.urlencode({'query': query}))
         return self.__do_api_request("get", url)
 
-    def __do_api_request(self, method, url, data=None):
+    def iter_query(self, endpoint, query=None, order_by=None, limit=None,
+            offset=None, page_size=None):
+        """
+        Run a query against an endpoint returning a list and yield the entries
+        one by one as they're received, so the whole response is never held
+        in memory. If page_size is given the results are fetched in several
+        requests of at most page_size entries each.
+
+        :param endpoint: the endpoint to query (e.g. "v4/facts")
+        :param query: the query string, if present
+        :param order_by: list of {"field": ..., "order": ...} dicts (or its
+            JSON representation) to sort the results by, required for paging
+        :param limit: maximum number of entries to return
+        :param offset: number of entries to skip
+        :param page_size: maximum number of entries fetched per request
+        :return: a generator of the parsed entries
+        :raise AiToolsPdbError: in case the query fails
+        """
+        if page_size and not order_by:
+            raise AiToolsPdbError("Paging through results requires order_by")
+        if order_by is not None and not isinstance(order_by, basestring):
+            order_by = json.dumps(order_by)
+        # Older versions of the API use a dash
+        order_param = "order-by" if re.match(r"/?v[23]/", endpoint) else "order_by"
+        offset = offset or 0
+        remaining = limit
+        while True:
+            params = []
+            if query:
+                params.append(('query', query))
+            if order_by:
+                params.append((order_param, order_by))
+            page_limit = page_size
+            if remaining is not None:
+                page_limit = min(page_size or remaining, remaining)
+            if page_limit:
+                params.append(('limit', page_limit))
+            if offset:
+                params.append(('offset', offset))
+            url = endpoint
+            if params:
+                url = "%s?%s" % (endpoint, urllib.urlencode(params))
+            count = 0
+            for entry in self.__iter_api_request(url):
+                count += 1
+                yield entry
+            if not page_size or count < page_limit:
+                return
+            offset += count
+            if remaining is not None:
+                remaining -= count
+                if remaining <= 0:
+                    return
+
+    def __build_bulk_queries(self, field, values, condition=None):
+        """
+        Splits an ["in", field, ["array", values]] query (and'ed with
+        condition, if given) into the minimum amount of queries whose
+        URL-encoded form is shorter than MAX_QUERY_LENGTH.
+        """
+        def dump(array):
+            query = pdbquery.in_(field, array)
+            if condition:
+                query = pdbquery.and_(query, condition)
+            return pdbquery.dumps(query)
+
+        return [dump(chunk) for chunk in split_by_query_length(values,
+            json.dumps, ',', base_length=len(urllib.quote_plus(dump([]))))]
+
+    def __iter_api_request(self, url):
+        url = self.__build_url(url)
+        headers = {'Accept': 'application/json',
+                   'Accept-Encoding': ACCEPT_ENCODING}
+        try:
+            code, response = super(PdbClient, self).do_request("get", url,
+                headers, stream=True)
+        except AiToolsHTTPClientError, error:
+            raise AiToolsPdbError(error)
+        try:
+            if code == requests.codes.forbidden or code == requests.codes.unauthorized:
+                raise AiToolsPdbNotAllowedError("Unauthorized trying 'get' at '%s'" % url)
+            if code == requests.codes.not_found:
+                raise AiToolsPdbNotFoundError("'%s' not found in PuppetDB" % url)
+            if code != requests.codes.ok:
+                raise AiToolsPdbError("PuppetDB returned %s (%s)" % (code, response.text))
+            for entry in iter_json_array(response.iter_content(STREAM_CHUNK_SIZE)):
+                yield entry
+        except ValueError, error:
+            raise AiToolsPdbError("Malformed response from PuppetDB (%s)" % error)
+        except requests.exceptions.RequestException, error:
+            raise AiToolsPdbError("Error reading response from PuppetDB (%s)" % error)
+        finally:
+            response.close()
+
+    def __build_url(self, url):
         url="https://%s:%u/%s" % \
             (self.host, self.port, url)
         if self.deref_alias:
             url = deref_url(url)
-        headers = {'Accept': 'application/json',
-                   'Accept-Encoding': 'deflate'}
-
         if self.show_url:
             print url
+        return url
+
+    def __do_api_request(self, method, url, data=None):
+        url = self.__build_url(url)
+        headers = {'Accept': 'application/json',
+                   'Accept-Encoding': ACCEPT_ENCODING}
+
         try:
             code, response = super(PdbClient, self).do_request(method, url, headers, data)
-            body = response.text
             if code == requests.codes.forbidden or code == requests.codes.unauthorized:
                 raise AiToolsPdbNotAllowedError("Unauthorized trying '%s' at '%s'" % (method, url))
             if re.match('application/json', response.headers['content-type']):
-                body = response.json()
+                body = self.decode_json(response)
+            else:
+                body = response.text
             return (code, body)
         except AiToolsHTTPClientError, error:
             raise AiToolsPdbError(error)
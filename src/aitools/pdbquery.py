@@ -0,0 +1,171 @@
+"""
+Helpers to compose PuppetDB v4 AST queries as plain Python structures,
+so values never have to be interpolated into query strings. For instance,
+the certname and value of the 'osfamily' fact of all the hosts in a
+hostgroup (and its subgroups), without transferring any other fact:
+
+    query = extract(["certname", "value"],
+        and_(equals("name", "osfamily"),
+             in_("certname", hosts_with_fact("hostgroup",
+                 subtree_regex("foo/bar"), op="~"))))
+    pdb.iter_query("v4/facts", dumps(query))
+
+And how many of them there are per value, counted by PuppetDB:
+
+    query = extract([count(), "value"], ..., group_by("value"))
+"""
+
+import re
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+BINARY_OPERATORS = ("=", "~", "<", "<=", ">", ">=", "~>")
+
+# Characters with a special meaning in PuppetDB (PostgreSQL) regexes
+REGEX_SPECIAL_CHARS_RE = re.compile(r"([\\.^$|?*+()\[\]{}])")
+
+def dumps(query):
+    """
+    Serializes a query in its most compact form, ready to be sent.
+
+    :param query: a query built with the functions of this module
+    :return: a JSON string
+    """
+    return json.dumps(query, separators=(',', ':'))
+
+def compare(op, field, value):
+    """
+    Builds a [op, field, value] condition.
+
+    :param op: one of BINARY_OPERATORS
+    :param field: the field to compare
+    :param value: the value to compare with
+    :raise ValueError: if the operator is not known
+    """
+    if op not in BINARY_OPERATORS:
+        raise ValueError("Unknown operator '%s'" % op)
+    return [op, _field(field), value]
+
+def equals(field, value):
+    return compare("=", field, value)
+
+def match(field, regex):
+    return compare("~", field, regex)
+
+def null(field, is_null=True):
+    return ["null?", _field(field), bool(is_null)]
+
+def and_(*conditions):
+    return _combine("and", conditions)
+
+def or_(*conditions):
+    return _combine("or", conditions)
+
+def not_(condition):
+    return ["not", condition]
+
+def in_(field, values):
+    """
+    Builds a condition matching entries whose field is either in a list
+    of values or in the results of a subquery. Prefer subqueries to
+    fetching the values first and passing them back to PuppetDB.
+
+    :param field: the field to look up
+    :param values: a list of values or a query built with extract()
+    """
+    if isinstance(values, (list, tuple)) and values and values[0] == "extract":
+        return ["in", _field(field), list(values)]
+    return ["in", _field(field), ["array", list(values)]]
+
+def count(field=None):
+    """
+    Counting function to be used as one of the fields of extract().
+
+    :param field: count the distinct values of this field instead of rows
+    """
+    if field:
+        return ["function", "count", _field(field)]
+    return ["function", "count"]
+
+def group_by(*fields):
+    if not fields:
+        raise ValueError("group_by needs at least a field")
+    return ["group_by"] + [_field(x) for x in fields]
+
+def extract(fields, query=None, grouping=None):
+    """
+    Restricts the results to some fields only (and optionally aggregates
+    them), so PuppetDB doesn't send anything that is not going to be used.
+
+    :param fields: a field name or a list of field names and functions
+    :param query: the condition entries have to fulfill, if any
+    :param grouping: a group_by() clause, if aggregating
+    """
+    if isinstance(fields, basestring):
+        fields = [fields]
+    expression = ["extract", list(fields)]
+    if query is not None:
+        expression.append(query)
+    if grouping is not None:
+        if query is None:
+            raise ValueError("group_by needs a query to group")
+        expression.append(grouping)
+    return expression
+
+def select(entity, query):
+    """
+    Builds a subquery against another entity, e.g. select("facts", ...).
+
+    :param entity: name of the entity (facts, resources, nodes, ...)
+    :param query: the condition the entities have to fulfill
+    """
+    return ["select_%s" % entity, query]
+
+def fact(name, value, op="="):
+    """
+    Builds a condition on the facts endpoint matching a fact by name
+    and value.
+    """
+    return and_(equals("name", name), compare(op, "value", value))
+
+def hosts_with_fact(name, value, op="="):
+    """
+    Builds a subquery returning the certnames of the hosts that have a
+    fact with a given value, to be used with in_("certname", ...).
+    """
+    return extract("certname", select("facts", fact(name, value, op)))
+
+def hostgroup_hosts(hostgroup, subgroups=False):
+    """
+    Builds a subquery returning the certnames of the hosts of a hostgroup
+    (and its subgroups, if asked to), to be used with in_("certname", ...).
+    """
+    if subgroups:
+        return hosts_with_fact("hostgroup", subtree_regex(hostgroup), op="~")
+    return hosts_with_fact("hostgroup", hostgroup)
+
+def escape_regex(value):
+    """
+    Escapes the characters with a special meaning in PuppetDB regexes.
+    """
+    return REGEX_SPECIAL_CHARS_RE.sub(r"\\\1", value)
+
+def subtree_regex(hostgroup):
+    """
+    Returns a regex matching a hostgroup and all its subgroups.
+    """
+    return "^%s(/.*)?$" % escape_regex(hostgroup)
+
+def _field(field):
+    if not isinstance(field, basestring) or not field:
+        raise ValueError("Invalid field '%s'" % (field,))
+    return field
+
+def _combine(op, conditions):
+    if not conditions:
+        raise ValueError("'%s' needs at least a condition" % op)
+    if len(conditions) == 1:
+        return conditions[0]
+    return [op] + list(conditions)
@@ -16,6 +16,7 @@ from aitools.errors import AiToolsPwnNotImplementedError
 from aitools.httpclient import HTTPClient
 from aitools.config import PwnConfig
 from aitools.common import deref_url
+from aitools.params import ACCEPT_ENCODING
 
 
 logger = logging.getLogger(__name__)
@@ -165,7 +166,7 @@ class PwnClient(HTTPClient):
         if self.deref_alias:
             url = deref_url(url)
         headers = {'Accept': 'application/json',
-                   'Accept-Encoding': 'deflate'}
+                   'Accept-Encoding': ACCEPT_ENCODING}
         if data:
             headers["Content-Type"] = "application/json"
 
@@ -173,12 +174,13 @@ class PwnClient(HTTPClient):
             print url
         try:
             code, response = super(PwnClient, self).do_request(method, url, headers, data)
-            body = response.text
             if code == requests.codes.unauthorized or code == requests.codes.forbidden:
                 raise AiToolsPwnNotAllowedError("Unauthorized trying '%s' at '%s'" % (method, url))
-            if code == requests.codes.ok:
-                if re.match('application/json', response.headers['content-type']):
-                    body = response.json()
+            if code == requests.codes.ok and \
+                    re.match('application/json', response.headers['content-type']):
+                body = self.decode_json(response)
+            else:
+                body = response.text
             return (code, body)
         except AiToolsHTTPClientError, error:
             raise AiToolsPwnError(error)
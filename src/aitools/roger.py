@@ -16,6 +16,7 @@ from aitools.errors import AiToolsRogerNotImplementedError
 from aitools.httpclient import HTTPClient
 from aitools.config import RogerConfig
 from aitools.common import deref_url
+from aitools.params import ACCEPT_ENCODING
 from distutils.util import strtobool
 
 logger = logging.getLogger(__name__)
@@ -150,7 +151,7 @@ class RogerClient(HTTPClient):
         if self.deref_alias:
             url = deref_url(url)
         headers = {'Accept': 'application/json',
-                   'Accept-Encoding': 'deflate'}
+                   'Accept-Encoding': ACCEPT_ENCODING}
         if data:
             headers["Content-Type"] = "application/json"
 
@@ -160,9 +161,10 @@ class RogerClient(HTTPClient):
             code, response = super(RogerClient, self).do_request(method, url, headers, data)
             if code == requests.codes.unauthorized or code == requests.codes.forbidden:
                 raise AiToolsRogerNotAllowedError("Forbidden trying '%s' at '%s'" % (method, url))
-            body = response.text
             if re.match('application/json', response.headers['content-type']):
-                body = response.json()
+                body = self.decode_json(response)
+            else:
+                body = response.text
             return (code, body)
         except AiToolsHTTPClientError, error:
             raise AiToolsRogerError(error)
@@ -19,6 +19,7 @@ import base64
 from distutils.util import strtobool
 from urllib import quote_plus
 from aitools.common import deref_url
+from aitools.params import ACCEPT_ENCODING
 
 logger = logging.getLogger(__name__)
 
@@ -136,7 +137,7 @@ class TrustedBagClient(HTTPClient):
         if self.deref_alias:
             url = deref_url(url)
         headers = {'Accept': 'application/json',
-                   'Accept-Encoding': 'deflate'}
+                   'Accept-Encoding': ACCEPT_ENCODING}
         if data:
             headers["Content-Type"] = "application/json"
 
@@ -144,12 +145,13 @@ class TrustedBagClient(HTTPClient):
             print url
         try:
             code, response = super(TrustedBagClient, self).do_request(method, url, headers, data)
-            body = response.text
             if code == requests.codes.unauthorized or code == requests.codes.forbidden:
                 raise AiToolsTrustedBagNotAllowedError("Unauthorized trying '%s' at '%s'" % (method, url))
-            if code == requests.codes.ok:
-                if re.match('application/json', response.headers['content-type']):
-                    body = response.json()
+            if code == requests.codes.ok and \
+                    re.match('application/json', response.headers['content-type']):
+                body = self.decode_json(response)
+            else:
+                body = response.text
             return (code, body)
         except AiToolsHTTPClientError, error:
             raise AiToolsTrustedBagError(error)
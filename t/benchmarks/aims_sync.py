@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+#
+# Compares waiting for AIMS to sync many hosts one after the other with
+# AimsClient.wait_for_readiness (what a single ai-installhost worker does)
+# and all at once with AimsClient.wait_for_readiness_many, against the fake
+# aims2client in t/. The sequential wait is only run for a sample of the
+# hosts and extrapolated, as it takes too long otherwise.
+#
+# Run from the top of the source tree:
+#   PYTHONPATH=src python t/benchmarks/aims_sync.py [-H HOSTS] [-c CHECKS]
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+from mock import patch
+
+import aitools.aims
+from aitools.aims import AimsClient, DEFAULT_SYNC_CONCURRENCY
+
+FAKE_AIMS2CLIENT = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "fake_aims2client")
+
+def main():
+    parser = argparse.ArgumentParser(description="AIMS sync wait benchmark")
+    parser.add_argument('-H', '--hosts', type=int, default=300,
+        help="Number of hosts to wait for (default: 300)")
+    parser.add_argument('-s', '--sample', type=int, default=10,
+        help="Number of hosts waited for sequentially (default: 10)")
+    parser.add_argument('-c', '--checks', type=int, default=3,
+        help="Checks a host needs before being synced (default: 3)")
+    parser.add_argument('-d', '--delay', type=float, default=0.3,
+        help="Seconds each aims2client call takes (default: 0.3)")
+    parser.add_argument('-w', '--waittime', type=float, default=1,
+        help="Seconds between checks (default: 1)")
+    parser.add_argument('-j', '--concurrency', type=int,
+        default=DEFAULT_SYNC_CONCURRENCY,
+        help="aims2client processes at once (default: %d)" %
+            DEFAULT_SYNC_CONCURRENCY)
+    args = parser.parse_args()
+
+    state = tempfile.mkdtemp()
+    os.environ.update({'FAKE_AIMS2CLIENT_STATE': state,
+        'FAKE_AIMS2CLIENT_CHECKS': str(args.checks),
+        'FAKE_AIMS2CLIENT_DELAY': str(args.delay)})
+    aims = AimsClient()
+    try:
+        with patch.object(aitools.aims, 'A2C_BIN_PATH', FAKE_AIMS2CLIENT), \
+                patch.object(aitools.aims, 'shortify',
+                    side_effect=lambda h: h.split('.')[0]):
+            start = time.time()
+            for index in xrange(args.sample):
+                aims.wait_for_readiness("seq%05d.cern.ch" % index,
+                    attempts=args.checks, waittime=args.waittime)
+            sequential = (time.time() - start) * args.hosts / args.sample
+
+            fqdns = ["many%05d.cern.ch" % index for index in xrange(args.hosts)]
+            start = time.time()
+            results = aims.wait_for_readiness_many(fqdns, deadline=3600,
+                waittime=args.waittime, max_waittime=args.waittime,
+                concurrency=args.concurrency)
+            many = time.time() - start
+            assert all(synced for (synced, _) in results.itervalues())
+    finally:
+        shutil.rmtree(state)
+
+    print "%d hosts, %d checks each, %.1fs per aims2client call" % (args.hosts,
+        args.checks, args.delay)
+    print "%-36s %10s" % ('Method', 'Time (s)')
+    print "%-36s %10.1f" % ("wait_for_readiness (extrapolated)", sequential)
+    print "%-36s %10.1f" % ("wait_for_readiness_many (-j %d)" %
+        args.concurrency, many)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+#
+# Compares the ways an ENC answer can get from the HTTP response to Python
+# objects: decoding response.text and using the pure Python loaders, or
+# handing the bytes to libyaml. Also measures a hit in EncClient's
+# in-process cache. The payload mimics what Foreman returns for a node.
+#
+# Run from the top of the source tree:
+#   PYTHONPATH=src python t/benchmarks/enc_parse.py [-p PARAMETERS] [-n RUNS]
+
+import sys
+import copy
+import time
+import argparse
+
+import yaml
+import requests
+
+from aitools.enc import yaml_loader
+
+def generate_enc(parameters):
+    interfaces = [{'ip': "188.184.%d.%d" % (x, x), 'mac': "02:16:3e:00:00:%02x" % x,
+        'name': "eth%d" % x, 'attrs': {'mtu': 1500, 'speed': 10000,
+        'duplex': 'full', 'virtual': False}} for x in range(4)]
+    params = {'comment': "Node generated for the benchmark",
+        'foreman_interfaces': interfaces, 'hostgroup': 'punch/aijens/app',
+        'root_pw': '$6$salt$' + 'x' * 86, 'puppetmaster': 'puppet.cern.ch',
+        'owner_name': 'Some Body', 'owner_email': 'some.body@cern.ch'}
+    for index in range(parameters):
+        params["parameter_%03d" % index] = "value of parameter %d" % index
+    return yaml.safe_dump({'classes': {'hg_punch::aijens::app': None},
+        'parameters': params, 'environment': 'production'},
+        default_flow_style=False)
+
+def response(body):
+    # As received from the ENC: no charset in the Content-Type
+    resp = requests.models.Response()
+    resp._content = body
+    resp.headers['Content-Type'] = 'application/yaml'
+    resp.status_code = 200
+    return resp
+
+def timeit(function, runs):
+    timings = []
+    for _ in xrange(runs):
+        start = time.time()
+        function()
+        timings.append(time.time() - start)
+    return min(timings) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description="ENC parsing benchmark")
+    parser.add_argument('-p', '--parameters', type=int, default=200,
+        help="Number of flat parameters in the payload (default: 200)")
+    parser.add_argument('-n', '--runs', type=int, default=20,
+        help="Number of runs per measurement (default: 20)")
+    args = parser.parse_args()
+
+    body = generate_enc(args.parameters)
+    parsed = yaml.load(body, Loader=yaml_loader())
+    print "Payload: %.1f KB, libyaml %savailable" % (len(body) / 1024.0,
+        "" if yaml.__with_libyaml__ else "not ")
+    cases = [
+        ("text + yaml.Loader (before)",
+            lambda: yaml.load(response(body).text, Loader=yaml.Loader)),
+        ("text + SafeLoader",
+            lambda: yaml.load(response(body).text, Loader=yaml.SafeLoader)),
+        ("content + %s (now)" % yaml_loader().__name__,
+            lambda: yaml.load(response(body).content, Loader=yaml_loader())),
+        ("in-process cache hit", lambda: copy.deepcopy(parsed)),
+    ]
+    print "%-32s %10s" % ('Parser', 'Time (ms)')
+    for (name, function) in cases:
+        print "%-32s %10.2f" % (name, timeit(function, args.runs))
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+#
+# Compares the ways PuppetDB fact payloads can be transferred and parsed:
+# bytes on the wire for each Content-Encoding and the time it takes to get
+# from the response to Python objects, against a local stub server that
+# serves a generated /v4/facts payload.
+#
+# Run from the top of the source tree:
+#   PYTHONPATH=src python t/benchmarks/pdb_transfer.py [-H HOSTS] [-F FACTS]
+
+import sys
+import zlib
+import gzip
+import time
+import argparse
+import threading
+import StringIO
+import BaseHTTPServer
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+import requests
+
+from aitools.common import iter_json_array
+from aitools.pdb import STREAM_CHUNK_SIZE
+
+def generate_facts(hosts, facts):
+    payload = []
+    for host in xrange(hosts):
+        certname = "host%05d.cern.ch" % host
+        for fact in xrange(facts):
+            payload.append({'certname': certname, 'environment': 'production',
+                'name': "fact_%03d" % fact,
+                'value': "value of fact %d on %s" % (fact, certname)})
+    return json.dumps(payload)
+
+class StubHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        accepted = [x.strip() for x in
+            self.headers.get('Accept-Encoding', '').split(',')]
+        encoding, body = 'identity', self.server.bodies['identity']
+        for candidate in ('gzip', 'deflate'):
+            if candidate in accepted:
+                encoding, body = candidate, self.server.bodies[candidate]
+                break
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        if encoding != 'identity':
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.wire_bytes = len(body)
+
+    def log_message(self, *args):
+        pass
+
+def start_server(document):
+    server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), StubHandler)
+    gzipped = StringIO.StringIO()
+    with gzip.GzipFile(fileobj=gzipped, mode='wb') as gzip_file:
+        gzip_file.write(document)
+    server.bodies = {'identity': document, 'gzip': gzipped.getvalue(),
+        'deflate': zlib.compress(document)}
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+# How responses used to be parsed: full text decode, then json
+def parse_text(session, url, encoding):
+    response = session.get(url, headers={'Accept-Encoding': encoding})
+    return len(json.loads(response.text))
+
+# HTTPClient.decode_json: parse the decompressed bytes directly
+def parse_content(session, url, encoding):
+    response = session.get(url, headers={'Accept-Encoding': encoding})
+    return len(json.loads(response.content))
+
+# PdbClient.iter_query: parse while the response is being decompressed
+def parse_stream(session, url, encoding):
+    response = session.get(url, headers={'Accept-Encoding': encoding}, stream=True)
+    count = 0
+    for _ in iter_json_array(response.iter_content(STREAM_CHUNK_SIZE)):
+        count += 1
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description="PuppetDB transfer benchmark")
+    parser.add_argument('-H', '--hosts', type=int, default=2000,
+        help="Number of hosts in the payload (default: 2000)")
+    parser.add_argument('-F', '--facts', type=int, default=50,
+        help="Number of facts per host (default: 50)")
+    parser.add_argument('-n', '--runs', type=int, default=3,
+        help="Number of runs per measurement (default: 3)")
+    args = parser.parse_args()
+
+    document = generate_facts(args.hosts, args.facts)
+    server = start_server(document)
+    url = "http://127.0.0.1:%d/v4/facts" % server.server_port
+    session = requests.Session()
+    print "Payload: %d facts, %.1f MB uncompressed" % (args.hosts * args.facts,
+        len(document) / 1048576.0)
+    print "%-17s %-8s %12s %12s" % ('Accept-Encoding', 'Parser', 'Wire (MB)', 'Time (ms)')
+    for encoding in ('identity', 'deflate', 'gzip, deflate'):
+        for name, parse in (('text', parse_text), ('content', parse_content),
+                ('stream', parse_stream)):
+            timings = []
+            for _ in xrange(args.runs):
+                start = time.time()
+                assert parse(session, url, encoding) == args.hosts * args.facts
+                timings.append(time.time() - start)
+            print "%-17s %-8s %12.2f %12.1f" % (encoding, name,
+                server.wire_bytes / 1048576.0, min(timings) * 1000)
+    server.shutdown()
+
+if __name__ == '__main__':
+    sys.exit(main())
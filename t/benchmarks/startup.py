@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+#
+# Measures how long the entry points take to start: printing --help and
+# answering a tab completion request, which is what users feel on every
+# invocation. Also lists the heavy modules that got imported on the way
+# to --help, which should be none of them.
+#
+# Run from the top of the source tree:
+#   PYTHONPATH=src python t/benchmarks/startup.py [-n RUNS] [SCRIPT...]
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+HEAVY_MODULES = ['krbV', 'kerberos', 'requests_kerberos', 'novaclient',
+    'cinderclient', 'keystoneauth1', 'keystoneclient', 'openstackclient',
+    'os_client_config', 'suds', 'email.mime.multipart', 'yaml']
+
+# Runs a script with --help and reports, on the original stdout, the
+# time spent and the heavy modules loaded.
+HELP_PROBE = """
+import os, sys, time, json, runpy
+heavy = json.loads(sys.argv[2])
+out = os.fdopen(os.dup(1), 'w')
+devnull = os.open(os.devnull, os.O_WRONLY)
+os.dup2(devnull, 1)
+os.dup2(devnull, 2)
+sys.argv = [sys.argv[1], '--help']
+start = time.time()
+error = None
+try:
+    runpy.run_path(sys.argv[0], run_name='__main__')
+except SystemExit:
+    pass
+except Exception, e:
+    error = "%s: %s" % (e.__class__.__name__, e)
+out.write(json.dumps({'elapsed': time.time() - start, 'error': error,
+    'heavy': [m for m in heavy if m in sys.modules]}))
+"""
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) / 2]
+
+def measure_help(script):
+    output = subprocess.check_output([sys.executable, '-c', HELP_PROBE,
+        script, json.dumps(HEAVY_MODULES)])
+    return json.loads(output)
+
+def measure_completion(script):
+    # argcomplete writes the completions to fd 8 and its debug
+    # output to fd 9, then exits.
+    env = dict(os.environ, _ARGCOMPLETE='1', _ARGCOMPLETE_IFS='\013',
+        COMP_LINE="%s --" % os.path.basename(script),
+        COMP_POINT=str(len(os.path.basename(script)) + 3))
+    def redirect():
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, 8)
+        os.dup2(devnull, 9)
+    with open(os.devnull, 'w') as devnull:
+        start = time.time()
+        subprocess.call([sys.executable, script], env=env, preexec_fn=redirect,
+            stdout=devnull, stderr=devnull)
+        return time.time() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Entry point startup benchmark")
+    parser.add_argument('-n', '--runs', type=int, default=5,
+        help="Number of runs per measurement (default: 5)")
+    parser.add_argument('script', nargs='*',
+        help="Scripts to measure (default: everything in bin/)")
+    args = parser.parse_args()
+
+    scripts = args.script or sorted([os.path.join('bin', x)
+        for x in os.listdir('bin')])
+
+    start = time.time()
+    for _ in xrange(args.runs):
+        subprocess.call([sys.executable, '-c', 'pass'])
+    print "Interpreter startup: %.1f ms" % ((time.time() - start) * 1000 / args.runs)
+    print "%-28s %10s %12s  %s" % ('Script', 'Help (ms)', 'Compl. (ms)', 'Heavy modules')
+    for script in scripts:
+        runs = [measure_help(script) for _ in xrange(args.runs)]
+        if runs[0]['error']:
+            print "%-28s %s" % (os.path.basename(script), runs[0]['error'])
+            continue
+        completion = median([measure_completion(script) for _ in xrange(args.runs)])
+        print "%-28s %10.1f %12.1f  %s" % (os.path.basename(script),
+            median([x['elapsed'] for x in runs]) * 1000, completion * 1000,
+            ", ".join(runs[0]['heavy']) or '-')
+
+if __name__ == '__main__':
+    main()
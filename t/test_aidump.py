@@ -0,0 +1,69 @@
+import os
+import imp
+import json
+import unittest
+import threading
+import StringIO
+from mock import Mock, patch
+
+aidump = imp.load_source('aidump', os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), '..', 'scripts', 'ai-dump'))
+
+class TestAiDumpBulk(unittest.TestCase):
+
+    def setUp(self):
+        self.pargs = Mock(hostgroup='punch/aijens', subgroups=False,
+            hosts_from=None, parallel=2, facts=None, enc=None)
+        self.pdb = Mock()
+        self.pdb.iter_query.return_value = iter([{'certname': 'a.cern.ch'},
+            {'certname': 'b.cern.ch'}, {'certname': 'c.cern.ch'}])
+        self.pdb.get_hosts_bulk.side_effect = lambda names: dict((name,
+            {'certname': name, 'deactivated': None}) for name in names)
+        self.pdb.get_facts_bulk.side_effect = lambda names, facts: dict(
+            (name, {'hostgroup': 'punch/aijens'}) for name in names)
+        self.pdb.get_landbsets_bulk.side_effect = lambda names: dict(
+            (name, []) for name in names)
+        self.pdb.get_lbaliases_bulk.side_effect = lambda names: dict(
+            (name, []) for name in names)
+        self.enc = Mock()
+
+    @patch.object(aidump, 'get_roger_client', return_value=None)
+    @patch.object(aidump, 'new_roger_client')
+    def test_bulk_host_failure_does_not_stop_the_dump(self, mock_new_roger,
+            mock_get_roger):
+        def get_node_enc(hostname):
+            parameters = {'comment': "Host %s" % hostname}
+            if hostname == 'b.cern.ch':
+                del parameters['comment']
+            return (200, {'environment': 'production', 'parameters': parameters})
+        self.enc.get_node_enc.side_effect = get_node_enc
+        stdout, stderr = StringIO.StringIO(), StringIO.StringIO()
+        with patch.object(aidump, 'PdbClient', return_value=self.pdb), \
+                patch.object(aidump, 'EncClient', return_value=self.enc), \
+                patch('sys.stdout', stdout), patch('sys.stderr', stderr):
+            failed = aidump.bulk_main(self.pargs, Mock(dereference_alias=False))
+        self.assertEquals(failed, 1)
+        records = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        self.assertEquals(sorted(record['hostname'] for record in records),
+            ['a.cern.ch', 'c.cern.ch'])
+        self.assertTrue("Couldn't dump b.cern.ch: KeyError" in stderr.getvalue())
+
+    @patch.object(aidump, 'get_roger_client', return_value=None)
+    @patch.object(aidump, 'new_roger_client')
+    def test_bulk_roger_client_per_thread(self, mock_new_roger, mock_get_roger):
+        mock_new_roger.side_effect = lambda: object()
+        used = {}
+        def get_roger_client(hostname, roger):
+            used.setdefault(threading.current_thread().ident, set()).add(roger)
+        mock_get_roger.side_effect = get_roger_client
+        self.enc.get_node_enc.return_value = (200, {'environment': 'production',
+            'parameters': {'comment': "Host"}})
+        with patch.object(aidump, 'PdbClient', return_value=self.pdb), \
+                patch.object(aidump, 'EncClient', return_value=self.enc), \
+                patch('sys.stdout', StringIO.StringIO()):
+            self.assertEquals(aidump.bulk_main(self.pargs,
+                Mock(dereference_alias=False)), 0)
+        self.assertEquals(mock_get_roger.call_count, 3)
+        # One client per thread, reused by all its hosts
+        self.assertTrue(all(len(clients) == 1 for clients in used.values()))
+        self.assertEquals(mock_new_roger.call_count, len(used))
@@ -1,7 +1,15 @@
+import os
+import time
+import shutil
+import tempfile
 import unittest
-from aitools.aims import AimsClient
+from mock import patch
+from aitools.aims import AimsClient, SyncSchedule
 from aitools.errors import AiToolsAimsError
 
+FAKE_AIMS2CLIENT = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+    "fake_aims2client")
+
 class TestAimsClient(unittest.TestCase):
 
     def setUp(self):
@@ -51,3 +59,100 @@ class TestAimsClient(unittest.TestCase):
         self.assertRaises(AiToolsAimsError,
             self.aims._translate_foreman_os_to_target,
             self.generate_os("FooOS", 4, 1), self.arch_64)
+
+    @patch.object(AimsClient, 'showhost')
+    def test_sync_status(self, mock_showhost):
+        mock_showhost.return_value = ("PXE boot synced: Y\n"
+            "PXE boot synced: N\n")
+        (synced, details) = self.aims.sync_status("foo.cern.ch")
+        self.assertFalse(synced)
+        self.assertEquals(details, mock_showhost.return_value)
+        mock_showhost.return_value = ("PXE boot synced: Y\n"
+            "PXE boot synced: y\n")
+        self.assertTrue(self.aims.sync_status("foo.cern.ch")[0])
+        mock_showhost.return_value = "Host not found"
+        self.assertFalse(self.aims.sync_status("foo.cern.ch")[0])
+
+    @patch('aitools.aims.A2C_BIN_PATH', FAKE_AIMS2CLIENT)
+    @patch('aitools.aims.shortify', side_effect=lambda h: h.split('.')[0])
+    def test_wait_for_readiness_many(self, mock_shortify):
+        state = tempfile.mkdtemp()
+        try:
+            with patch.dict(os.environ, {'FAKE_AIMS2CLIENT_STATE': state,
+                    'FAKE_AIMS2CLIENT_CHECKS': '2'}):
+                results = self.aims.wait_for_readiness_many(["foo.cern.ch",
+                    "bar.cern.ch", "unsynced.cern.ch", "unknown.cern.ch"],
+                    deadline=2, waittime=0.1, max_waittime=0.2)
+            self.assertEquals(open(os.path.join(state, "foo")).read(), "2")
+        finally:
+            shutil.rmtree(state)
+        self.assertTrue(results["foo.cern.ch"][0])
+        self.assertTrue(results["bar.cern.ch"][0])
+        self.assertFalse(results["unsynced.cern.ch"][0])
+        self.assertTrue("PXE boot synced:          N" in results["unsynced.cern.ch"][1])
+        self.assertFalse(results["unknown.cern.ch"][0])
+        self.assertTrue("not found" in results["unknown.cern.ch"][1])
+
+    @patch('aitools.aims.time')
+    @patch.object(AimsClient, 'sync_status')
+    def test_wait_for_readiness_many_backoff(self, mock_sync_status, mock_time):
+        clock = [0]
+        def sleep(seconds):
+            clock[0] += seconds
+        mock_time.time.side_effect = lambda: clock[0]
+        mock_time.sleep.side_effect = sleep
+        checks = []
+        def sync_status(fqdn):
+            checks.append((fqdn, clock[0]))
+            return (fqdn == "bar.cern.ch" and clock[0] >= 30, "")
+        mock_sync_status.side_effect = sync_status
+        results = self.aims.wait_for_readiness_many(["foo.cern.ch",
+            "bar.cern.ch"], deadline=100, waittime=10, max_waittime=40)
+        self.assertEquals([x[1] for x in checks if x[0] == "foo.cern.ch"],
+            [0, 10, 30, 70, 100])
+        self.assertEquals([x[1] for x in checks if x[0] == "bar.cern.ch"],
+            [0, 10, 30])
+        self.assertEquals(results, {"foo.cern.ch": (False, ""),
+            "bar.cern.ch": (True, "")})
+
+    @patch('aitools.aims.time')
+    def test_sync_schedule(self, mock_time):
+        clock = [0]
+        mock_time.time.side_effect = lambda: clock[0]
+        schedule = SyncSchedule(waittime=10, max_waittime=20)
+        self.assertEquals(schedule.next_wait(), None)
+        schedule.add("foo", 50)
+        clock[0] = 5
+        schedule.add("bar", 10)
+        self.assertEquals(sorted(schedule.due()), ["bar", "foo"])
+        self.assertFalse(schedule.checked("foo", False))
+        self.assertFalse(schedule.checked("bar", False))
+        self.assertEquals(schedule.next_wait(), 10)
+        clock[0] = 15
+        # bar's last check is at its own deadline
+        self.assertEquals(sorted(schedule.due()), ["bar", "foo"])
+        self.assertTrue(schedule.checked("bar", False))
+        self.assertFalse(schedule.checked("foo", False))
+        self.assertEquals(schedule.next_wait(), 20)
+        clock[0] = 35
+        self.assertTrue(schedule.checked("foo", True))
+        self.assertEquals(len(schedule), 0)
+
+    def test_wait_for_readiness_many_dryrun(self):
+        aims = AimsClient(dryrun=True)
+        self.assertEquals(aims.wait_for_readiness_many(["foo.cern.ch"], 10),
+            {"foo.cern.ch": (True, "")})
+
+    @patch('aitools.aims.A2C_BIN_PATH', FAKE_AIMS2CLIENT)
+    @patch('aitools.aims.shortify', side_effect=lambda h: h.split('.')[0])
+    def test_addhost_ks_from_memory(self, mock_shortify):
+        state = tempfile.mkdtemp()
+        # Bigger than a pipe buffer
+        ks = "".join("part /srv%d --size=1024\n" % x for x in range(10000))
+        try:
+            with patch.dict(os.environ, {'FAKE_AIMS2CLIENT_STATE': state}):
+                self.aims.addhost("foo.cern.ch", self.generate_os("CentOS", 7, 1),
+                    self.arch_64, None, {}, ks, "tty0", "bios")
+            self.assertEquals(open(os.path.join(state, "foo.ks")).read(), ks)
+        finally:
+            shutil.rmtree(state)
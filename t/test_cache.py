@@ -0,0 +1,56 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+
+from aitools.cache import DiskCache
+
+class TestDiskCache(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.cache = DiskCache('foo', 60, path=self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_set_and_get(self):
+        self.cache.set('key', {'id': 1})
+        self.assertEquals(self.cache.get('key'), {'id': 1})
+        self.assertEquals(DiskCache('foo', 60, path=self.path).get('key'), {'id': 1})
+
+    def test_miss(self):
+        self.assertEquals(self.cache.get('nope'), None)
+        self.assertEquals(self.cache.get('nope', default=3), 3)
+
+    def test_expired(self):
+        self.cache.set('key', 1)
+        with patch('aitools.cache.time.time', return_value=10**10):
+            self.assertEquals(self.cache.get('key'), None)
+        self.assertEquals(os.listdir(self.cache.path), [])
+
+    def test_delete(self):
+        self.cache.set('key', 1)
+        self.cache.delete('key')
+        self.cache.delete('key')
+        self.assertEquals(self.cache.get('key'), None)
+
+    def test_disabled(self):
+        cache = DiskCache('foo', 0, path=self.path)
+        cache.set('key', 1)
+        self.assertEquals(cache.get('key'), None)
+        self.assertFalse(os.path.exists(cache.path))
+
+    def test_corrupted_entry(self):
+        self.cache.set('key', 1)
+        for entry in os.listdir(self.cache.path):
+            with open(os.path.join(self.cache.path, entry), 'w') as f:
+                f.write("{garbage")
+        self.assertEquals(self.cache.get('key'), None)
+
+    def test_unserializable_value(self):
+        self.cache.set('key', object())
+        self.assertEquals(self.cache.get('key'), None)
+        self.assertEquals(os.listdir(self.cache.path), [])
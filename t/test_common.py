@@ -2,13 +2,17 @@ __author__ = 'Alberto Rodriguez Peon'
 
 import unittest
 import re
+import json
+import urllib
 
-from mock import MagicMock
+from mock import MagicMock, Mock, patch
 
 from aitools.common import is_valid_UUID
 from aitools.common import generator_device_names
 from aitools.common import is_valid_size_format
 from aitools.common import get_nova_image_id
+from aitools.common import iter_json_array
+from aitools.common import split_by_query_length
 from aitools.errors import AiToolsNovaError
 
 IMAGE_ID = '389323ff-25ba-4994-af99-5fee5ab3aa76'
@@ -120,3 +124,62 @@ class TestCommon(unittest.TestCase):
         self.assertRaises(AiToolsNovaError, get_nova_image_id, nova, 'cc7', 'test')
         self.assertFalse(nova.find_image_by_name.called)
         self.assertTrue(nova.get_latest_image.called)
+
+    def test_iter_json_array_split_everywhere(self):
+        document = u' [ {"a": [1, 2]}, "x\\"]\u00e9", 123 , -4.5e3, true, null ]'.encode('utf-8')
+        expected = [{'a': [1, 2]}, u'x"]\xe9', 123, -4.5e3, True, None]
+        for size in range(1, len(document) + 1):
+            chunks = [document[x:x+size] for x in range(0, len(document), size)]
+            self.assertEquals(list(iter_json_array(chunks)), expected)
+
+    def test_iter_json_array_big_element_decoded_once(self):
+        element = {'facts': dict(("fact%d" % x, "value \\ \"%d\" [{,}]" % x)
+            for x in range(2000))}
+        document = json.dumps([element, 1, element])
+        chunks = [document[x:x+100] for x in range(0, len(document), 100)]
+        real_decoder = json.JSONDecoder()
+        decoder = Mock()
+        decoder.raw_decode.side_effect = real_decoder.raw_decode
+        with patch('aitools.common.json.JSONDecoder', return_value=decoder):
+            self.assertEquals(list(iter_json_array(chunks)), [element, 1, element])
+        self.assertTrue(len(chunks) > 1000)
+        self.assertTrue(decoder.raw_decode.call_count <= 6)
+
+    def test_iter_json_array_invalid(self):
+        self.assertRaises(ValueError, list, iter_json_array(['[1, {"a": 1}}', ', 2]']))
+        self.assertRaises(ValueError, list, iter_json_array(['[tru,', ' 2]']))
+
+    def test_iter_json_array_is_lazy(self):
+        def chunks():
+            yield '[{"a": 1}, '
+            raise AssertionError("Read too much")
+        self.assertEquals(iter_json_array(chunks()).next(), {'a': 1})
+
+    def test_iter_json_array_empty(self):
+        self.assertEquals(list(iter_json_array(['[', ' ]'])), [])
+
+    def test_iter_json_array_not_an_array(self):
+        self.assertEquals(list(iter_json_array(['{"a"', ': 1}'])), [{'a': 1}])
+
+    def test_iter_json_array_truncated(self):
+        self.assertRaises(ValueError, list, iter_json_array(['[1, {"a": ']))
+        self.assertRaises(ValueError, list, iter_json_array(['[1, 2']))
+        self.assertRaises(ValueError, list, iter_json_array(['']))
+
+    def test_split_by_query_length(self):
+        names = ["host%d.cern.ch" % x for x in range(100)]
+        encode = lambda name: "name=%s" % name
+        groups = split_by_query_length(names, encode, " or ", max_length=200)
+        self.assertTrue(len(groups) > 1)
+        self.assertEquals(sum(groups, []), names)
+        for group in groups:
+            query = " or ".join([encode(name) for name in group])
+            self.assertTrue(len(urllib.quote_plus(query)) <= 200)
+        # The rest of the query counts too
+        self.assertTrue(len(split_by_query_length(names, encode, " or ",
+            base_length=100, max_length=200)) > len(groups))
+
+    def test_split_by_query_length_long_item(self):
+        self.assertEquals(split_by_query_length(["a" * 30, "b", "c"],
+            lambda x: x, ",", max_length=10), [["a" * 30], ["b", "c"]])
+        self.assertEquals(split_by_query_length([], lambda x: x, ","), [])
@@ -0,0 +1,136 @@
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+from mock import Mock, patch
+
+from aitools.completer import CompletionIndex, ForemanCompleter
+from aitools.completer import COMPLETION_REFRESH_PER_PAGE
+
+class TestCompletionIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.index = CompletionIndex('foo', ttl=60, path=self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_missing(self):
+        self.assertEquals(self.index.age(), None)
+        self.assertTrue(self.index.stale())
+        self.assertEquals(self.index.lookup('a'), None)
+
+    def test_lookup(self):
+        self.index.write(['foo2', 'bar', 'foo1', 'fo', 'foo1', u'g\xfc'])
+        self.assertFalse(self.index.stale())
+        self.assertEquals(self.index.lookup('foo'), ['foo1', 'foo2'])
+        self.assertEquals(self.index.lookup('fo'), ['fo', 'foo1', 'foo2'])
+        self.assertEquals(self.index.lookup('g\xc3\xbc'), [u'g\xfc'])
+        self.assertEquals(self.index.lookup('z'), [])
+        self.assertEquals(len(self.index.lookup('')), 5)
+
+    def test_lookup_large_index(self):
+        entries = ["host%05d.cern.ch" % x for x in range(0, 20000, 2)]
+        self.index.write(entries)
+        self.assertEquals(self.index.lookup('host0000'),
+            ["host0000%d.cern.ch" % x for x in range(0, 10, 2)])
+        self.assertEquals(self.index.lookup('host19998'), ["host19998.cern.ch"])
+        self.assertEquals(self.index.lookup('host00001'), [])
+        self.assertEquals(self.index.lookup('a'), [])
+        self.assertEquals(self.index.lookup('i'), [])
+        self.assertEquals(self.index.lookup('host1234'),
+            ["host1234%d.cern.ch" % x for x in range(0, 10, 2)])
+        self.assertEquals(len(self.index.lookup('host')), 10000)
+
+    def test_lookup_reads_only_around_the_matches(self):
+        self.index.write(["host%05d.cern.ch" % x for x in range(100000)])
+        real_open = open
+        read = []
+        class CountingFile(object):
+            def __init__(self, *args):
+                self.real = real_open(*args)
+            def __getattr__(self, name):
+                return getattr(self.real, name)
+            def __enter__(self):
+                return self
+            def __exit__(self, *args):
+                self.real.close()
+            def __iter__(self):
+                for line in self.real:
+                    read.append(len(line))
+                    yield line
+            def readline(self):
+                line = self.real.readline()
+                read.append(len(line))
+                return line
+            def read(self, *args):
+                data = self.real.read(*args)
+                read.append(len(data))
+                return data
+        with patch('aitools.completer.open', CountingFile, create=True):
+            self.assertEquals(self.index.lookup('host5000'),
+                ["host5000%d.cern.ch" % x for x in range(10)])
+        # Nowhere near the whole index
+        self.assertTrue(os.path.getsize(self.index.path) > 1000000)
+        self.assertTrue(sum(read) < 2000)
+
+    def test_stale(self):
+        self.index.write(['foo'])
+        with patch('aitools.completer.time.time', return_value=time.time() + 120):
+            self.assertTrue(self.index.stale())
+
+    @patch('aitools.completer.os.fork', return_value=1234)
+    def test_only_one_refresh_at_a_time(self, mock_fork):
+        self.index.refresh_in_background(lambda: [])
+        self.index.refresh_in_background(lambda: [])
+        self.assertEquals(mock_fork.call_count, 1)
+        os.utime("%s.lock" % self.index.path, (0, 0))
+        self.index.refresh_in_background(lambda: [])
+        self.assertEquals(mock_fork.call_count, 2)
+
+class TestForemanCompleter(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.foreman = Mock(host='foreman.cern.ch')
+        self.foreman.search_query.return_value = [{'name': 'foo1.cern.ch'},
+            {'name': 'bar.cern.ch'}]
+        self.index = CompletionIndex('foreman.cern.ch-hosts-name', path=self.path)
+        patcher = patch('aitools.completer.ForemanClient', return_value=self.foreman)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch('aitools.completer.get_cache_path', return_value=self.path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    @patch.object(CompletionIndex, 'refresh_in_background')
+    def test_answers_from_index(self, mock_refresh):
+        self.index.write(['foo1.cern.ch', 'foo2.cern.ch'])
+        self.assertEquals(ForemanCompleter()('foo', None),
+            ['foo1.cern.ch', 'foo2.cern.ch'])
+        self.assertFalse(self.foreman.search_query.called)
+        self.assertFalse(mock_refresh.called)
+
+    @patch.object(CompletionIndex, 'refresh_in_background')
+    def test_falls_back_to_foreman(self, mock_refresh):
+        self.assertEquals(ForemanCompleter()('foo', None), ['foo1.cern.ch'])
+        self.foreman.search_query.assert_called_once_with('hosts', 'name~foo')
+        self.assertEquals(mock_refresh.call_count, 1)
+        fetch = mock_refresh.call_args[0][0]
+        self.assertEquals(fetch(), ['foo1.cern.ch', 'bar.cern.ch'])
+        self.foreman.search_query.assert_called_with('hosts', '',
+            per_page=COMPLETION_REFRESH_PER_PAGE)
+
+    @patch.object(CompletionIndex, 'refresh_in_background')
+    def test_stale_index_is_used_while_refreshing(self, mock_refresh):
+        self.index.write(['foo1.cern.ch'])
+        os.utime(self.index.path, (0, 0))
+        self.assertEquals(ForemanCompleter()('f', None), ['foo1.cern.ch'])
+        self.assertEquals(mock_refresh.call_count, 1)
+        self.assertFalse(self.foreman.search_query.called)
@@ -1,8 +1,11 @@
+import shutil
+import tempfile
 import unittest
 import requests
 from mock import Mock, patch
 
 from aitools.enc import EncClient
+from aitools.cache import DiskCache
 from aitools.httpclient import HTTPClient
 from aitools.errors import AiToolsEncError
 
@@ -12,7 +15,7 @@ class TestEnc(unittest.TestCase):
         self.enc = EncClient(host='none.cern.ch', port=1, timeout=1)
 
     @patch.object(HTTPClient, 'do_request',
-        return_value=[requests.codes.ok, Mock(text="{'foo': 'bar'}")])
+        return_value=[requests.codes.ok, Mock(content="{'foo': 'bar'}")])
     def test_ok(self, mock_get):
         (code, classification) = self.enc.get_node_enc('foo.cern.ch')
         self.assertEquals(classification['foo'], 'bar')
@@ -33,3 +36,30 @@ class TestEnc(unittest.TestCase):
         return_value=[requests.codes.precondition_failed, Mock(text="Fail")])
     def test_computation_failure(self, mock_get):
         self.assertRaises(AiToolsEncError, self.enc.get_node_enc, 'foo.cern.ch')
+
+    @patch.object(HTTPClient, 'do_request',
+        return_value=[requests.codes.ok, Mock(content="foo: !!python/object:os.system bar")])
+    def test_unsafe_yaml_is_rejected(self, mock_get):
+        self.assertRaises(Exception, self.enc.get_node_enc, 'foo.cern.ch')
+
+    def test_cache_disabled_by_default(self):
+        self.assertFalse(self.enc.disk_cache.enabled())
+
+    @patch.object(HTTPClient, 'do_request',
+        return_value=[requests.codes.ok, Mock(content="classes:\n  foo: {}\n")])
+    def test_cached(self, mock_get):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        self.enc.disk_cache = DiskCache('enc', 60, path=path)
+        (code, classification) = self.enc.get_node_enc('foo.cern.ch')
+        classification['classes']['bar'] = None
+        self.assertEquals(self.enc.get_node_enc('foo.cern.ch'),
+            (requests.codes.ok, {'classes': {'foo': {}}}))
+        self.assertEquals(mock_get.call_count, 1)
+        # Another client (or process) finds it on disk
+        other = EncClient(host='none.cern.ch', port=1, timeout=1)
+        other.disk_cache = self.enc.disk_cache
+        self.assertEquals(other.get_node_enc('foo.cern.ch')[1], {'classes': {'foo': {}}})
+        self.assertEquals(mock_get.call_count, 1)
+        self.enc.get_node_enc('bar.cern.ch')
+        self.assertEquals(mock_get.call_count, 2)
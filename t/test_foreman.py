@@ -2,10 +2,13 @@ import unittest
 import requests
 import json
 import urllib
+import shutil
+import tempfile
 
 from mock import Mock, patch, ANY, call
 
 from aitools.foreman import ForemanClient
+from aitools.cache import DiskCache
 from aitools.httpclient import HTTPClient
 from aitools.errors import AiToolsForemanError
 from aitools.errors import AiToolsForemanNotFoundError
@@ -106,6 +109,58 @@ class TestForemanClient(unittest.TestCase):
                 full_uri("environments/?search=%s&page=1" %
                     urllib.quote('name="production"')), ANY, None)
 
+    #### DISK CACHE ####
+
+    @patch.object(HTTPClient, 'do_request',
+        return_value=generate_response(requests.codes.OK,
+            [{"name":"production","id":16}], meta=True))
+    def test_resolve_model_id_disk_cache(self, mock_client):
+        path = tempfile.mkdtemp()
+        try:
+            first = ForemanClient(host=TEST_HOST, port=TEST_PORT, timeout=1)
+            first.disk_cache = DiskCache('foreman', 60, path=path)
+            self.assertEquals(first._ForemanClient__resolve_model_id(
+                "environment", "production"), 16)
+            second = ForemanClient(host=TEST_HOST, port=TEST_PORT, timeout=1)
+            second.disk_cache = DiskCache('foreman', 60, path=path)
+            self.assertEquals(second._ForemanClient__resolve_model_id(
+                "environment", "production"), 16)
+            self.assertEquals(mock_client.call_count, 1)
+        finally:
+            shutil.rmtree(path)
+
+    @patch.object(HTTPClient, 'do_request',
+        return_value=generate_response(requests.codes.OK,
+            {"name":"punch","id":2}))
+    def test_resolve_model_not_disk_cached(self, mock_client):
+        path = tempfile.mkdtemp()
+        try:
+            for _ in range(2):
+                client = ForemanClient(host=TEST_HOST, port=TEST_PORT, timeout=1)
+                client.disk_cache = DiskCache('foreman', 60, path=path)
+                self.assertEquals(client._ForemanClient__resolve_model(
+                    "hostgroup", 2)['name'], "punch")
+            self.assertEquals(mock_client.call_count, 2)
+        finally:
+            shutil.rmtree(path)
+
+    @patch.object(HTTPClient, 'do_request')
+    def test_disk_cache_invalidated_on_unprocessable_entity(self, mock_client):
+        path = tempfile.mkdtemp()
+        try:
+            self.client.disk_cache = DiskCache('foreman', 60, path=path)
+            self.client.disk_cache.set("%s|environment_qa_id" % TEST_HOST, 3)
+            mock_client.return_value = generate_response(
+                requests.codes.unprocessable_entity,
+                {'error': {'full_messages': ['Environment is invalid']}})
+            self.assertRaises(AiToolsForemanError, self.client.updatehost,
+                {'name': 'foo.cern.ch'}, environment='qa')
+            self.assertEquals(self.client.disk_cache.get(
+                "%s|environment_qa_id" % TEST_HOST), None)
+            self.assertFalse('environment_qa_id' in self.client.cache)
+        finally:
+            shutil.rmtree(path)
+
     #### SEARCH_QUERY ####
 
     @patch.object(HTTPClient, 'do_request', side_effect=
@@ -163,6 +218,108 @@ class TestForemanClient(unittest.TestCase):
             call('get', full_uri("%s/?search=%s&page=2" %
                     (model, urllib.quote(query))), ANY, None)])
 
+    @patch('aitools.foreman.print_progress_meter')
+    @patch.object(HTTPClient, 'do_request')
+    def test_resolve_search_query_expensive_in_parallel(self, mock_client, mock_meter):
+        model = "foomodel"
+        query = 'name="production"'
+        def page_response(method, url, headers, data):
+            page = int(url.split('page=')[1])
+            return generate_response(requests.codes.OK,
+                [{"name":"foo%d" % page, "id":page}],
+                meta=True, page=page, page_size=1, subtotal=7)
+        mock_client.side_effect = page_response
+        client = ForemanClient(host=TEST_HOST, port=TEST_PORT, timeout=1,
+            max_parallel_pages=3)
+        results = client.search_query(model, query)
+        self.assertEquals([r['id'] for r in results], range(1, 8))
+        self.assertEquals(mock_client.call_count, 7)
+        for page in range(1, 8):
+            mock_client.assert_any_call('get', full_uri("%s/?search=%s&page=%d" %
+                (model, urllib.quote(query), page)), ANY, None)
+
+    @patch('aitools.foreman.print_progress_meter')
+    @patch.object(HTTPClient, 'do_request')
+    def test_resolve_search_query_expensive_page_fails(self, mock_client, mock_meter):
+        mock_client.side_effect = lambda method, url, headers, data: \
+            generate_response(requests.codes.OK if url.endswith('page=1')
+                else requests.codes.bad_request, [],
+                meta=True, page_size=1, subtotal=7)
+        client = ForemanClient(host=TEST_HOST, port=TEST_PORT, timeout=1,
+            max_parallel_pages=3)
+        self.assertRaises(AiToolsForemanError, client.search_query,
+            "foomodel", 'name="production"')
+
+    #### ITER_SEARCH ####
+
+    @patch.object(HTTPClient, 'do_request', side_effect=
+        [
+            generate_response(requests.codes.OK,
+                [{"name":"foo","id":1}, {"name":"bar","id":2}],
+                meta=True, page=1, page_size=2, subtotal=3),
+            generate_response(requests.codes.OK,
+                [{"name":"baz","id":3}],
+                meta=True, page=2, page_size=2, subtotal=3)
+        ])
+    def test_iter_search_multiple_pages(self, mock_client):
+        model = "foomodel"
+        query = 'name="production"'
+        results = self.client.iter_search(model, query, per_page=2)
+        self.assertEquals(results.next()['name'], "foo")
+        self.assertEquals(mock_client.call_count, 1)
+        self.assertEquals([r['name'] for r in results], ["bar", "baz"])
+        super(ForemanClient, self.client).do_request\
+            .assert_has_calls([
+            call('get', full_uri("%s/?search=%s&page=1&per_page=2" %
+                    (model, urllib.quote(query))), ANY, None),
+            call('get', full_uri("%s/?search=%s&page=2&per_page=2" %
+                    (model, urllib.quote(query))), ANY, None)])
+
+    @patch.object(HTTPClient, 'do_request', return_value=
+            generate_response(requests.codes.OK, [],
+                meta=True, page=1, page_size=5, subtotal=0))
+    def test_iter_search_no_results(self, mock_client):
+        self.assertEquals(list(self.client.iter_search("foomodel", "foo")), [])
+        self.assertEquals(mock_client.call_count, 1)
+
+    @patch.object(HTTPClient, 'do_request', return_value=
+            generate_response(requests.codes.bad_request, [],
+                meta=True, page=1, page_size=5, subtotal=0))
+    def test_iter_search_error(self, mock_client):
+        self.assertRaises(AiToolsForemanError, list,
+            self.client.iter_search("foomodel", "foo"))
+
+    #### PREFETCH_MODELS ####
+
+    @patch.object(HTTPClient, 'do_request', return_value=
+            generate_response(requests.codes.OK,
+                [{"id": 1, "title": "Foo 6.3"}, {"id": 2, "title": "Bar 7.1"},
+                 {"id": 3, "title": "Dup 1.0"}, {"id": 4, "title": "Dup 1.0"}],
+                meta=True, page=1, page_size=1000, subtotal=4))
+    def test_prefetch_models(self, mock_client):
+        self.assertEquals(self.client.prefetch_models(['operatingsystem']), 2)
+        super(ForemanClient, self.client).do_request\
+            .assert_called_once_with('get',
+                full_uri("operatingsystems/?search=&page=1&per_page=1000"), ANY, None)
+        self.assertEquals(self.client._ForemanClient__resolve_operatingsystem_id(
+            "Bar 7.1"), 2)
+        self.assertEquals(mock_client.call_count, 1)
+
+    @patch.object(HTTPClient, 'do_request', return_value=
+            generate_response(requests.codes.OK,
+                [{"id": 1, "title": "punch/foo", "label": "punch/foo"},
+                 {"id": 2, "title": "punch/bar"}],
+                meta=True, page=1, page_size=1000, subtotal=2))
+    def test_prefetch_hostgroups_by_label(self, mock_client):
+        self.assertEquals(self.client.prefetch_models(['hostgroup']), 1)
+        self.assertEquals(self.client._ForemanClient__resolve_hostgroup_id(
+            "punch/foo"), 1)
+        self.assertEquals(mock_client.call_count, 1)
+
+    def test_prefetch_models_unknown_model(self):
+        self.assertRaises(AiToolsForemanError,
+            self.client.prefetch_models, ['foo'])
+
     #### SPECIFIC RESOLVERS ####
 
     @patch.object(ForemanClient, '_ForemanClient__resolve_model_id',
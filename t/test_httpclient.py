@@ -0,0 +1,73 @@
+import unittest
+import threading
+import requests
+
+from mock import Mock, patch
+
+from aitools.httpclient import HTTPClient
+from aitools.errors import AiToolsHTTPClientError
+
+class DummyClient(HTTPClient):
+    def __init__(self, pool_size=None):
+        self.timeout = 1
+        self.pool_size = pool_size
+
+class TestHTTPClient(unittest.TestCase):
+
+    def setUp(self):
+        self.client = DummyClient(pool_size=4)
+
+    def test_session_is_reused(self):
+        session = self.client.get_session()
+        self.assertTrue(session is self.client.get_session())
+        self.assertFalse(session is DummyClient().get_session())
+
+    def test_pool_size(self):
+        adapter = self.client.get_session().get_adapter('https://foo.cern.ch')
+        self.assertEquals(adapter._pool_maxsize, 4)
+
+    @patch('aitools.httpclient.AiConfig')
+    def test_ensure_pool_size(self, mock_config):
+        mock_config.return_value.http_pool_size = '20'
+        client = DummyClient()
+        client.ensure_pool_size(8)
+        self.assertEquals(client.pool_size, None)
+        client.ensure_pool_size(32)
+        self.assertEquals(client.pool_size, 32)
+        self.client.ensure_pool_size(2)
+        self.assertEquals(self.client.pool_size, 4)
+
+    def test_auth_is_per_thread(self):
+        auth = self.client.get_auth()
+        self.assertTrue(auth is self.client.get_auth())
+        other = []
+        thread = threading.Thread(target=lambda: other.append(self.client.get_auth()))
+        thread.start()
+        thread.join()
+        self.assertFalse(auth is other[0])
+
+    @patch.object(requests.Session, 'get',
+        return_value=Mock(status_code=requests.codes.ok, text="foo"))
+    def test_auth_becomes_preemptive(self, mock_get):
+        self.client.do_request('get', 'https://foo.cern.ch/', {})
+        self.assertTrue(self.client.get_auth().force_preemptive)
+
+    @patch.object(requests.Session, 'get',
+        return_value=Mock(status_code=requests.codes.unauthorized, text="foo"))
+    def test_auth_not_preemptive_if_unauthorized(self, mock_get):
+        self.client.do_request('get', 'https://foo.cern.ch/', {})
+        self.assertFalse(self.client.get_auth().force_preemptive)
+
+    @patch.object(requests.Session, 'get',
+        side_effect=requests.exceptions.ConnectionError("boom"))
+    def test_connection_error(self, mock_get):
+        self.assertRaises(AiToolsHTTPClientError, self.client.do_request,
+            'get', 'https://foo.cern.ch/', {})
+
+    def test_decode_json(self):
+        response = requests.Response()
+        response._content = u'{"caf\u00e9": [1, 2]}'.encode('utf-8')
+        response.headers['content-type'] = 'application/json'
+        self.assertEquals(self.client.decode_json(response), {u'caf\xe9': [1, 2]})
+        response._content = '{'
+        self.assertRaises(ValueError, self.client.decode_json, response)
@@ -0,0 +1,114 @@
+import os
+import shutil
+import datetime
+import tempfile
+import unittest
+
+from mock import Mock, patch
+from dateutil import tz
+
+from aitools.inventory import Inventory, SYNC_PER_PAGE
+from aitools.errors import AiToolsInventoryError
+
+def host(name, hostgroup, last_report, updated_at, enabled=True):
+    return {'name': name, 'hostgroup_name': hostgroup.split('/')[-1],
+        'hostgroup_title': hostgroup, 'environment_name': 'production',
+        'operatingsystem_name': 'CentOS 7.4', 'architecture_name': 'x86_64',
+        'model_name': 'OpenStack Nova', 'ptable_name': 'Default',
+        'comment': None, 'enabled': enabled, 'last_report': last_report,
+        'updated_at': updated_at, 'ip': '127.0.0.1'}
+
+HOSTS = [
+    host('a.cern.ch', 'foo/bar', '2017-05-01T10:00:00Z', '2017-05-01T10:00:00Z'),
+    host('b.cern.ch', 'foo/baz', '2017-05-01 12:00:00 UTC', '2017-05-01T12:00:00Z'),
+    host('c.cern.ch', 'fop', None, '2017-04-01T12:00:00Z', enabled=False),
+]
+
+class TestInventory(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.foreman = Mock(host='foreman.cern.ch')
+        self.foreman.search_query.return_value = HOSTS
+        self.inventory = Inventory(self.foreman,
+            path=os.path.join(self.path, 'sub', 'inventory.sqlite'))
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_never_synced(self):
+        self.assertEquals(self.inventory.age(), None)
+        self.assertFalse(os.path.exists(self.inventory.path))
+
+    def test_full_sync(self):
+        self.assertEquals(self.inventory.sync(), 3)
+        self.foreman.search_query.assert_called_once_with("hosts", "",
+            per_page=SYNC_PER_PAGE)
+        self.assertTrue(self.inventory.age() < 60)
+        hosts = self.inventory.search()
+        self.assertEquals([x['name'] for x in hosts],
+            ['a.cern.ch', 'b.cern.ch', 'c.cern.ch'])
+        self.assertEquals(hosts[1]['last_report'], '2017-05-01T12:00:00Z')
+        self.assertEquals(hosts[1]['hostgroup_name'], 'baz')
+        self.assertFalse('ip' in hosts[1])
+        self.assertFalse(hosts[2]['enabled'])
+
+    def test_incremental_sync(self):
+        self.inventory.sync()
+        updated = host('a.cern.ch', 'foo/qux', '2017-05-02T10:00:00Z',
+            '2017-05-02T10:00:00Z')
+        self.foreman.search_query.return_value = [updated]
+        self.assertEquals(self.inventory.sync(), 1)
+        self.foreman.search_query.assert_called_with("hosts",
+            "updated_at >= \"2017-05-01 12:00:00 UTC\"", per_page=SYNC_PER_PAGE)
+        self.assertEquals(len(self.inventory.search()), 3)
+        self.assertEquals(self.inventory.search(names=['a.cern.ch'])[0]['hostgroup_title'],
+            'foo/qux')
+        self.foreman.search_query.return_value = []
+        self.inventory.sync()
+        self.foreman.search_query.assert_called_with("hosts",
+            "updated_at >= \"2017-05-02 10:00:00 UTC\"", per_page=SYNC_PER_PAGE)
+
+    def test_stale_snapshot_gets_fully_synced(self):
+        self.inventory.sync()
+        self.foreman.search_query.return_value = HOSTS[:1]
+        with patch('aitools.inventory.time.time', return_value=10**10):
+            self.inventory.sync()
+        self.foreman.search_query.assert_called_with("hosts", "", per_page=SYNC_PER_PAGE)
+        self.assertEquals(len(self.inventory.search()), 1)
+
+    def test_search_by_hostgroup(self):
+        self.inventory.sync()
+        self.assertEquals([x['name'] for x in self.inventory.search(hostgroup='foo/bar')],
+            ['a.cern.ch'])
+        self.assertEquals([x['name'] for x in self.inventory.search(hostgroup_like='foo/')],
+            ['a.cern.ch', 'b.cern.ch'])
+        self.assertEquals([x['name'] for x in self.inventory.search(hostgroup_like='fo')],
+            ['a.cern.ch', 'b.cern.ch', 'c.cern.ch'])
+        # Anywhere in the name and regardless of case, like Foreman's ~
+        self.assertEquals([x['name'] for x in self.inventory.search(hostgroup_like='BA')],
+            ['a.cern.ch', 'b.cern.ch'])
+        self.assertEquals([x['name'] for x in self.inventory.search(hostgroup_like='o/bar')],
+            ['a.cern.ch'])
+        self.assertEquals(self.inventory.search(hostgroup_like='%'), [])
+        self.assertEquals(self.inventory.search(hostgroup_like='f_o'), [])
+
+    def test_search_by_last_report(self):
+        self.inventory.sync()
+        when = datetime.datetime(2017, 5, 1, 11, 0, 0, tzinfo=tz.tzutc())
+        self.assertEquals([x['name'] for x in self.inventory.search(reported_before=when)],
+            ['a.cern.ch', 'c.cern.ch'])
+        self.assertEquals([x['name'] for x in self.inventory.search(reported_before=when,
+            enabled=True)], ['a.cern.ch'])
+        self.assertEquals([x['name'] for x in self.inventory.search(reported_after=when)],
+            ['b.cern.ch'])
+
+    def test_search_by_names(self):
+        self.inventory.sync()
+        with patch('aitools.inventory.MAX_NAMES_PER_QUERY', 1):
+            hosts = self.inventory.search(names=['c.cern.ch', 'a.cern.ch', 'z.cern.ch'])
+        self.assertEquals(sorted([x['name'] for x in hosts]), ['a.cern.ch', 'c.cern.ch'])
+
+    def test_unwritable_snapshot(self):
+        inventory = Inventory(self.foreman, path=self.path)
+        self.assertRaises(AiToolsInventoryError, inventory.sync)
@@ -1,6 +1,12 @@
+import json
+import shutil
+import urllib
+import tempfile
 import unittest
 from mock import Mock, patch
 from aitools.pdb import PdbClient
+from aitools.cache import DiskCache
+from aitools.httpclient import HTTPClient
 from aitools.errors import AiToolsPdbError, AiToolsPdbNotFoundError
 
 
@@ -60,3 +66,206 @@ class TestPdbClient(unittest.TestCase):
         mock_pdb_request.return_value = (200, returned_body)
         assert self.pdb.get_facts(self.hostname, self.fact) == {'fact1':'value1'}
         mock_pdb_request.assert_called_once()
+
+    # PdbClient.get_facts with the fact cache enabled
+    def __facts_responses(self, timestamp, values):
+        def respond(method, url):
+            if url == "v4/nodes/%s" % self.hostname:
+                return (200, {u'certname': self.hostname, u'facts_timestamp': timestamp})
+            if url.startswith("v4/factsets?"):
+                query = json.loads(urllib.unquote_plus(url.split("query=")[1]))
+                if query != ["=", "certname", self.hostname]:
+                    return (200, [])
+                return (200, [{u'certname': self.hostname, u'timestamp': timestamp,
+                    u'environment': u'production',
+                    u'facts': {u'href': u'/pdb/query/v4/factsets/%s/facts' % self.hostname,
+                        u'data': [{u'name': name, u'value': value}
+                            for name, value in values.items()]}}])
+            return (200, [{u'certname': self.hostname, u'name': name, u'value': value}
+                for name, value in values.items()])
+        return respond
+
+    def __enable_fact_cache(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        self.pdb.fact_cache = DiskCache('pdb-facts', 60, path=path)
+
+    def test_fact_cache_disabled_by_default(self):
+        self.assertFalse(self.pdb.fact_cache.enabled())
+
+    @patch.object(PdbClient, '_PdbClient__do_api_request')
+    def test_get_facts_cached_until_facts_timestamp_changes(self, mock_pdb_request):
+        self.__enable_fact_cache()
+        mock_pdb_request.side_effect = self.__facts_responses(u'2017-05-01T10:00:00Z',
+            {u'fact1': u'value1', u'fact2': u'value2'})
+        facts = self.pdb.get_facts(self.hostname)
+        self.assertEquals(facts, {u'fact1': u'value1', u'fact2': u'value2'})
+        # Nothing cached yet, so nothing to validate
+        mock_pdb_request.assert_called_once()
+        self.assertTrue(mock_pdb_request.call_args[0][1].startswith("v4/factsets?"))
+        self.assertEquals(self.pdb.get_facts(self.hostname), facts)
+        self.assertEquals(self.pdb.get_facts(self.hostname, u'fact2'), {u'fact2': u'value2'})
+        self.assertRaises(AiToolsPdbNotFoundError, self.pdb.get_facts,
+            self.hostname, 'nofact')
+        # Only the nodes endpoint was queried while the facts didn't change
+        self.assertEquals(mock_pdb_request.call_count, 4)
+        self.assertEquals(mock_pdb_request.call_args[0][1], "v4/nodes/%s" % self.hostname)
+        mock_pdb_request.side_effect = self.__facts_responses(u'2017-05-01T10:30:00Z',
+            {u'fact1': u'value3'})
+        self.assertEquals(self.pdb.get_facts(self.hostname), {u'fact1': u'value3'})
+        self.assertEquals(mock_pdb_request.call_count, 6)
+        self.assertEquals(self.pdb.get_facts(self.hostname), {u'fact1': u'value3'})
+        self.assertEquals(mock_pdb_request.call_count, 7)
+
+    @patch.object(PdbClient, '_PdbClient__do_api_request')
+    def test_get_single_fact_not_cached(self, mock_pdb_request):
+        self.__enable_fact_cache()
+        mock_pdb_request.side_effect = self.__facts_responses(u'2017-05-01T10:00:00Z',
+            {u'fact1': u'value1'})
+        self.pdb.get_facts(self.hostname, u'fact1')
+        mock_pdb_request.assert_called_once_with("get",
+            "v4/nodes/%s/facts/fact1" % self.hostname)
+        self.pdb.get_facts(self.hostname, u'fact1')
+        self.assertEquals(mock_pdb_request.call_count, 2)
+
+    @patch.object(PdbClient, '_PdbClient__do_api_request', return_value=(200, []))
+    def test_get_facts_cached_machine_not_in_pdb(self, mock_pdb_request):
+        self.__enable_fact_cache()
+        self.assertRaises(AiToolsPdbNotFoundError, self.pdb.get_facts, self.hostname)
+        mock_pdb_request.assert_called_once()
+
+    # PdbClient.get_facts_bulk
+    @patch.object(PdbClient, '_PdbClient__do_api_request')
+    def test_get_facts_bulk_happy_path(self, mock_pdb_request):
+        returned_body = [{u'certname': u'host1', u'name': u'fact1', u'value': u'value1'},
+                         {u'certname': u'host1', u'name': u'fact2', u'value': u'value2'},
+                         {u'certname': u'host2', u'name': u'fact1', u'value': u'value3'}]
+        mock_pdb_request.return_value = (200, returned_body)
+        assert self.pdb.get_facts_bulk(['host1', 'host2', 'host3'],
+            facts=['fact1', 'fact2']) == {'host1': {'fact1': 'value1', 'fact2': 'value2'},
+                                          'host2': {'fact1': 'value3'}}
+        mock_pdb_request.assert_called_once()
+        url = mock_pdb_request.call_args[0][1]
+        assert url.startswith("v4/facts?")
+        query = json.loads(urllib.unquote_plus(url.split("query=")[1]))
+        assert query == ["and", ["in", "certname", ["array", ["host1", "host2", "host3"]]],
+            ["in", "name", ["array", ["fact1", "fact2"]]]]
+
+    @patch.object(PdbClient, '_PdbClient__do_api_request', return_value=(200, []))
+    @patch('aitools.common.MAX_QUERY_LENGTH', 200)
+    def test_get_facts_bulk_chunks_queries(self, mock_pdb_request):
+        hostnames = ["host%04d.cern.ch" % x for x in range(50)]
+        assert self.pdb.get_facts_bulk(hostnames) == {}
+        assert mock_pdb_request.call_count > 1
+        requested = []
+        for call in mock_pdb_request.call_args_list:
+            query = urllib.quote_plus(urllib.unquote_plus(call[0][1].split("query=")[1]))
+            assert len(query) <= 200
+            requested.extend(json.loads(urllib.unquote_plus(query))[2][1])
+        assert requested == hostnames
+
+    @patch.object(PdbClient, '_PdbClient__do_api_request', return_value=(500, "boom"))
+    def test_get_facts_bulk_error(self, mock_pdb_request):
+        self.assertRaises(AiToolsPdbError, self.pdb.get_facts_bulk, ['host1'])
+
+    # PdbClient.get_hosts_bulk
+    @patch.object(PdbClient, '_PdbClient__do_api_request')
+    def test_get_hosts_bulk(self, mock_pdb_request):
+        mock_pdb_request.return_value = (200, [{u'certname': u'host1', u'deactivated': None},
+            {u'certname': u'host2', u'deactivated': u'2017-05-01T10:00:00Z'}])
+        hosts = self.pdb.get_hosts_bulk(['host1', 'host2', 'host3'])
+        assert sorted(hosts.keys()) == ['host1', 'host2']
+        assert hosts['host2']['deactivated'] == u'2017-05-01T10:00:00Z'
+        url = mock_pdb_request.call_args[0][1]
+        assert url.startswith("v4/nodes?")
+        query = json.loads(urllib.unquote_plus(url.split("query=")[1]))
+        assert query == ["and", ["in", "certname", ["array", ["host1", "host2", "host3"]]],
+            ["=", "node_state", "any"]]
+
+    @patch.object(PdbClient, '_PdbClient__do_api_request', return_value=(500, "boom"))
+    def test_get_hosts_bulk_error(self, mock_pdb_request):
+        self.assertRaises(AiToolsPdbError, self.pdb.get_hosts_bulk, ['host1'])
+
+    # PdbClient.get_landbsets_bulk/get_lbaliases_bulk
+    @patch.object(PdbClient, '_PdbClient__do_api_request')
+    def test_get_landbsets_bulk(self, mock_pdb_request):
+        mock_pdb_request.return_value = (200, [
+            {u'certname': u'host1', u'type': u'Cernfw::Landbset', u'title': u'SET1'},
+            {u'certname': u'host1', u'type': u'Cernfw::Landbset', u'title': u'SET2'}])
+        assert self.pdb.get_landbsets_bulk(['host1', 'host2']) == \
+            {'host1': ['SET1', 'SET2'], 'host2': []}
+        mock_pdb_request.assert_called_once()
+        url = mock_pdb_request.call_args[0][1]
+        assert url.startswith("v4/resources?")
+        query = json.loads(urllib.unquote_plus(url.split("query=")[1]))
+        assert query == ["and", ["in", "certname", ["array", ["host1", "host2"]]],
+            ["=", "type", "Cernfw::Landbset"]]
+
+    @patch.object(PdbClient, '_PdbClient__do_api_request')
+    def test_get_lbaliases_bulk_by_hostgroup(self, mock_pdb_request):
+        mock_pdb_request.return_value = (200, [{u'certname': u'host1',
+            u'type': u'Lbd::Client', u'parameters': {u'lbalias': u'alias1'}}])
+        assert self.pdb.get_lbaliases_bulk(hostgroup='foo/bar', subgroups=True) == \
+            {'host1': ['alias1']}
+        mock_pdb_request.assert_called_once()
+        url = mock_pdb_request.call_args[0][1]
+        query = json.loads(urllib.unquote_plus(url.split("query=")[1]))
+        assert query == ["and", ["=", "type", "Lbd::Client"], ["in", "certname",
+            ["extract", ["certname"], ["select_facts", ["and", ["=", "name", "hostgroup"],
+                ["~", "value", "^foo/bar(/.*)?$"]]]]]]
+
+    @patch.object(PdbClient, '_PdbClient__do_api_request', return_value=(500, "boom"))
+    def test_get_resources_bulk_error(self, mock_pdb_request):
+        self.assertRaises(AiToolsPdbError, self.pdb.get_landbsets_bulk, ['host1'])
+
+    # PdbClient.iter_query
+    def __response(self, entries, code=200):
+        body = json.dumps(entries)
+        return (code, Mock(text=body,
+            iter_content=lambda size: [body[x:x+3] for x in range(0, len(body), 3)]))
+
+    @patch.object(HTTPClient, 'do_request')
+    def test_iter_query_streams(self, mock_request):
+        mock_request.return_value = self.__response([{'certname': 'host1'},
+            {'certname': 'host2'}])
+        assert list(self.pdb.iter_query("v4/nodes", '["=", "a", "b"]')) == \
+            [{'certname': 'host1'}, {'certname': 'host2'}]
+        args, kwargs = mock_request.call_args
+        assert args[1] == "https://fakepdb:1/v4/nodes?" + \
+            urllib.urlencode({'query': '["=", "a", "b"]'})
+        assert kwargs['stream']
+        assert 'gzip' in args[2]['Accept-Encoding']
+        mock_request.return_value[1].close.assert_called_once_with()
+
+    @patch.object(HTTPClient, 'do_request')
+    def test_iter_query_pages(self, mock_request):
+        mock_request.side_effect = [self.__response([1, 2]),
+            self.__response([3, 4]), self.__response([5])]
+        order_by = [{'field': 'certname'}]
+        assert list(self.pdb.iter_query("v4/nodes", order_by=order_by,
+            page_size=2)) == [1, 2, 3, 4, 5]
+        urls = [call[0][1] for call in mock_request.call_args_list]
+        assert "limit=2" in urls[0] and "offset" not in urls[0]
+        assert "order_by=" + urllib.quote_plus(json.dumps(order_by)) in urls[0]
+        assert "offset=2" in urls[1] and "offset=4" in urls[2]
+
+    @patch.object(HTTPClient, 'do_request')
+    def test_iter_query_pages_with_limit(self, mock_request):
+        mock_request.side_effect = [self.__response([1, 2]), self.__response([3])]
+        assert list(self.pdb.iter_query("/v3/facts", order_by='[]', limit=3,
+            offset=10, page_size=2)) == [1, 2, 3]
+        urls = [call[0][1] for call in mock_request.call_args_list]
+        assert "order-by=" in urls[0]
+        assert "limit=2" in urls[0] and "offset=10" in urls[0]
+        assert "limit=1" in urls[1] and "offset=12" in urls[1]
+
+    def test_iter_query_paging_needs_order(self):
+        self.assertRaises(AiToolsPdbError, list,
+            self.pdb.iter_query("v4/nodes", page_size=2))
+
+    @patch.object(HTTPClient, 'do_request')
+    def test_iter_query_errors(self, mock_request):
+        mock_request.return_value = self.__response("nope", code=404)
+        self.assertRaises(AiToolsPdbNotFoundError, list, self.pdb.iter_query("v4/nodes"))
+        mock_request.return_value = (200, Mock(iter_content=lambda size: ['[1, {']))
+        self.assertRaises(AiToolsPdbError, list, self.pdb.iter_query("v4/nodes"))
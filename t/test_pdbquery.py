@@ -0,0 +1,56 @@
+import re
+import json
+import unittest
+
+from aitools import pdbquery
+
+class TestPdbQuery(unittest.TestCase):
+
+    def test_conditions(self):
+        self.assertEquals(pdbquery.equals("name", "hostgroup"),
+            ["=", "name", "hostgroup"])
+        self.assertEquals(pdbquery.match("value", "^foo"), ["~", "value", "^foo"])
+        self.assertEquals(pdbquery.null("deactivated"), ["null?", "deactivated", True])
+        self.assertEquals(pdbquery.not_(pdbquery.equals("a", 1)), ["not", ["=", "a", 1]])
+        self.assertRaises(ValueError, pdbquery.compare, "==", "name", "foo")
+        self.assertRaises(ValueError, pdbquery.equals, None, "foo")
+
+    def test_boolean_operators(self):
+        a, b = pdbquery.equals("a", 1), pdbquery.equals("b", 2)
+        self.assertEquals(pdbquery.and_(a, b), ["and", a, b])
+        self.assertEquals(pdbquery.or_(a, b), ["or", a, b])
+        self.assertEquals(pdbquery.and_(a), a)
+        self.assertRaises(ValueError, pdbquery.and_)
+
+    def test_in_array_and_subquery(self):
+        self.assertEquals(pdbquery.in_("certname", ("a", "b")),
+            ["in", "certname", ["array", ["a", "b"]]])
+        self.assertEquals(pdbquery.in_("certname",
+            pdbquery.hosts_with_fact("hostgroup", "foo")),
+            ["in", "certname", ["extract", ["certname"], ["select_facts",
+                ["and", ["=", "name", "hostgroup"], ["=", "value", "foo"]]]]])
+
+    def test_extract_and_aggregate(self):
+        self.assertEquals(pdbquery.extract("certname"), ["extract", ["certname"]])
+        self.assertEquals(pdbquery.extract([pdbquery.count(), "value"],
+            pdbquery.equals("name", "os"), pdbquery.group_by("value")),
+            ["extract", [["function", "count"], "value"], ["=", "name", "os"],
+                ["group_by", "value"]])
+        self.assertEquals(pdbquery.count("certname"), ["function", "count", "certname"])
+        self.assertRaises(ValueError, pdbquery.extract, "value", None,
+            pdbquery.group_by("value"))
+        self.assertRaises(ValueError, pdbquery.group_by)
+
+    def test_values_are_not_interpolated(self):
+        query = pdbquery.dumps(pdbquery.equals("value", 'foo", "bar'))
+        self.assertEquals(json.loads(query), ["=", "value", 'foo", "bar'])
+        self.assertFalse(" " in pdbquery.dumps(pdbquery.and_(
+            pdbquery.equals("a", 1), pdbquery.equals("b", 2))))
+
+    def test_subtree_regex(self):
+        regex = re.compile(pdbquery.subtree_regex("foo/b.r+"))
+        self.assertTrue(regex.match("foo/b.r+"))
+        self.assertTrue(regex.match("foo/b.r+/baz"))
+        self.assertFalse(regex.match("foo/bar"))
+        self.assertFalse(regex.match("foo/b.r+baz"))
+        self.assertFalse(regex.match("qux/foo/b.r+"))